@@ -0,0 +1,205 @@
+"""
+Seeded generators of synthetic inputs for the Python tools, so that they can be
+benchmarked without the network or files from other repos.
+
+    python generate.py --scale 10 --output /tmp/bench-inputs
+
+The same seed and scale always generate the same files: a worker-pools.yml, the docs
+trees of Taskcluster (ui/docs) and Taskgraph (docs), and a text corpus with one
+document per line.
+"""
+
+import json
+import random
+import argparse
+from pathlib import Path
+
+root_dir = Path(__file__).resolve().parent.parent
+cost_dir = root_dir / "src" / "cost"
+
+# The number of items at a scale of 1.
+base_sizes = {"pools": 100, "docs": 40, "corpus_lines": 5_000}
+
+syllables = (
+    "ta sk clu ster gra ph wor ker po ol que ue ar ti fa ct de ci sion run ner in dex "
+    "sche du le tra ns la tion mo del cor pus"
+).split()
+
+
+def make_vocabulary(rng, size=5_000):
+    words = set()
+    while len(words) < size:
+        words.add("".join(rng.choice(syllables) for _ in range(rng.randint(1, 4))))
+    return sorted(words)
+
+
+def sentence(rng, vocabulary, words):
+    text = " ".join(rng.choice(vocabulary) for _ in range(words))
+    return text[0].upper() + text[1:] + "."
+
+
+def paragraph(rng, vocabulary):
+    return " ".join(
+        sentence(rng, vocabulary, rng.randint(6, 20)) for _ in range(rng.randint(2, 6))
+    )
+
+
+def generate_worker_pools(path, pools, seed=0):
+    """
+    Writes a worker-pools.yml with `pools` pools, using predefined, custom and GPU
+    machine types, attributes, and variants with lists that expand into several pools.
+    """
+    rng = random.Random(seed)
+    machine_types = sorted(json.loads((cost_dir / "cpu_costs.json").read_text()))
+    gpu_types = sorted(json.loads((cost_dir / "gpu_costs.json").read_text()))
+    with path.open("w") as f:
+        f.write("pool-defaults:\n  owner: nobody@mozilla.com\n")
+        f.write("pools:\n")
+        for i in range(pools):
+            kind = rng.choice(["b", "t"])
+            f.write(f"  - pool_id: '{{pool-group}}/{kind}-linux-{i}{{suffix}}'\n")
+            f.write(f"    description: Synthetic pool {i}\n")
+            f.write("    owner: nobody@mozilla.com\n")
+            f.write("    attributes:\n")
+            f.write(f"      cores: {rng.choice([2, 4, 8, 16, 32])}\n")
+            f.write("    variants:\n")
+            for level in range(rng.randint(1, 3)):
+                f.write(f"      - pool-group: translations-{level + 1}\n")
+                f.write("        suffix: ['', '-standard', '-d2g']\n")
+            f.write("    config:\n")
+            f.write("      instance_types:\n")
+            choice = rng.random()
+            if choice < 0.5:
+                f.write(f"        - machine_type: {rng.choice(machine_types)}\n")
+            elif choice < 0.8:
+                memory = rng.choice([4, 6, 8]) * 1024
+                f.write(f"        - machine_type: n2-custom-{{cores}}-{memory}\n")
+            else:
+                f.write("        - machine_type: n1-standard-8\n")
+                f.write("          guestAccelerators:\n")
+                f.write(
+                    f"            - acceleratorType: {rng.choice(gpu_types)}\n"
+                    f"              acceleratorCount: {rng.choice([1, 2, 4])}\n"
+                )
+            f.write("          disks:\n")
+            f.write("            - type: PERSISTENT\n")
+            f.write(f"              diskSizeGb: {rng.randrange(50, 500)}\n")
+
+
+def markdown_doc(rng, vocabulary, boilerplate):
+    lines = [f"# {sentence(rng, vocabulary, 3)[:-1]}", ""]
+    for _ in range(rng.randint(2, 8)):
+        lines += [f"## {sentence(rng, vocabulary, 2)[:-1]}", ""]
+        for _ in range(rng.randint(1, 4)):
+            if rng.random() < 0.2:
+                lines += [rng.choice(boilerplate), ""]
+            else:
+                lines += [paragraph(rng, vocabulary), ""]
+        if rng.random() < 0.3:
+            lines += ["```yaml", f"{rng.choice(vocabulary)}: {rng.randint(0, 99)}"]
+            lines += ["```", ""]
+    return "\n".join(lines)
+
+
+def rst_doc(rng, vocabulary, boilerplate):
+    title = sentence(rng, vocabulary, 3)[:-1]
+    lines = [title, "=" * len(title), ""]
+    for _ in range(rng.randint(2, 8)):
+        heading = sentence(rng, vocabulary, 2)[:-1]
+        lines += [heading, "-" * len(heading), ""]
+        for _ in range(rng.randint(1, 4)):
+            if rng.random() < 0.2:
+                lines += [rng.choice(boilerplate), ""]
+            else:
+                lines += [paragraph(rng, vocabulary), ""]
+        if rng.random() < 0.3:
+            lines += [".. code-block:: yaml", ""]
+            lines += [f"    {rng.choice(vocabulary)}: {rng.randint(0, 99)}", ""]
+    return "\n".join(lines)
+
+
+def generate_docs(docs_dir, docs, extensions, seed=0):
+    """
+    Writes `docs` docs into nested directories, with an index in every directory.
+    Some paragraphs are shared boilerplate, and some docs are versioned copies of
+    earlier ones with a few words changed, as in the real docs.
+    """
+    rng = random.Random(seed)
+    vocabulary = make_vocabulary(rng)
+    boilerplate = [paragraph(rng, vocabulary) for _ in range(10)]
+    docs_dir.mkdir(parents=True, exist_ok=True)
+    written = []
+    for i in range(docs):
+        depth = rng.randint(0, 3)
+        directory = docs_dir.joinpath(
+            *(f"section-{rng.randint(0, 5)}" for _ in range(depth))
+        )
+        extension = rng.choice(extensions)
+        path = directory / f"index{extension}"
+        if path.exists():
+            path = directory / f"page-{i}{extension}"
+        if written and rng.random() < 0.1:
+            # A versioned copy.
+            words = rng.choice(written).read_text().split(" ")
+            for _ in range(3):
+                words[rng.randrange(len(words))] = rng.choice(vocabulary)
+            text = " ".join(words)
+        elif extension == ".rst":
+            text = rst_doc(rng, vocabulary, boilerplate)
+        else:
+            text = markdown_doc(rng, vocabulary, boilerplate)
+        directory.mkdir(parents=True, exist_ok=True)
+        path.write_text(text)
+        written.append(path)
+    # Files that the builders leave out.
+    (docs_dir / "README.txt").write_text("Not a doc.\n")
+
+
+def generate_corpus(path, lines, seed=0):
+    """Writes `lines` documents, one per line, with a long tail of lengths."""
+    rng = random.Random(seed)
+    vocabulary = make_vocabulary(rng)
+    with path.open("w") as f:
+        for _ in range(lines):
+            words = min(400, max(1, int(rng.lognormvariate(3, 0.8))))
+            f.write(sentence(rng, vocabulary, words) + "\n")
+
+
+def generate_inputs(output_dir, scale, seed=0):
+    """Writes every input at the scale, and returns their paths."""
+    output_dir.mkdir(parents=True, exist_ok=True)
+    paths = {
+        "worker_pools": output_dir / "worker-pools.yml",
+        "taskcluster": output_dir / "taskcluster",
+        "taskgraph": output_dir / "taskgraph",
+        "corpus": output_dir / "corpus.txt",
+    }
+    generate_worker_pools(paths["worker_pools"], base_sizes["pools"] * scale, seed)
+    generate_docs(
+        paths["taskcluster"] / "ui" / "docs",
+        base_sizes["docs"] * scale,
+        [".md", ".mdx"],
+        seed,
+    )
+    generate_docs(
+        paths["taskgraph"] / "docs", base_sizes["docs"] * scale, [".rst", ".md"], seed
+    )
+    generate_corpus(paths["corpus"], base_sizes["corpus_lines"] * scale, seed)
+    return paths
+
+
+def main():
+    parser = argparse.ArgumentParser(
+        description=__doc__, formatter_class=argparse.RawDescriptionHelpFormatter
+    )
+    parser.add_argument("--scale", type=int, default=1)
+    parser.add_argument("--seed", type=int, default=0)
+    parser.add_argument("--output", type=Path, required=True)
+    args = parser.parse_args()
+
+    for name, path in generate_inputs(args.output, args.scale, args.seed).items():
+        print(f"Generated {name} at {path}")
+
+
+if __name__ == "__main__":
+    main()
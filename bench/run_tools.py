@@ -0,0 +1,302 @@
+"""
+Runs every Python tool end to end on synthetic inputs at several scales, records the
+wall time and peak RSS of each run, and appends them to tools_results.json.
+
+    python run_tools.py
+    python run_tools.py --scales 1 10 100 --cases taskgraph taskgraph-noop
+
+The inputs are generated with generate.py, and worker-pools.yml is served by a local
+server, so nothing is fetched from the network. Every tool runs in its own process, and
+its peak RSS includes the worker processes it waited for.
+
+Each result is compared with the median of the previous runs of the same case and scale
+on a machine of the same kind. When it is slower, or uses more memory, by more than the
+thresholds, the regressions are listed and the exit status is 1, as it is when a tool
+fails.
+"""
+
+import os
+import sys
+import json
+import time
+import argparse
+import datetime
+import platform
+import shutil
+import statistics
+import subprocess
+import tempfile
+from pathlib import Path
+from generate import generate_inputs, root_dir, cost_dir
+from server import LocalServer
+
+results_path = Path("tools_results.json")
+benchmark_dir = root_dir / "src" / "benchmark"
+gpt_dir = root_dir / "gpt"
+
+gpt_flags = ["--dedup", "--search-index", "--chunk-tokens", "8000"]
+case_names = [
+    "extract_machines",
+    "extract_machines-cached",
+    "tokenize_input",
+    "taskcluster",
+    "taskcluster-noop",
+    "taskgraph",
+    "taskgraph-noop",
+]
+
+
+def tree_bytes(path):
+    if path.is_file():
+        return path.stat().st_size
+    return sum(p.stat().st_size for p in path.rglob("*") if p.is_file())
+
+
+def make_cases(inputs, url, work_dir):
+    """
+    The command of every case. The -cached and -noop cases re-run the case before
+    them, when none of the inputs changed.
+    """
+    python = sys.executable
+    extract_machines = [
+        python,
+        str(cost_dir / "extract_machines.py"),
+        "--url",
+        url,
+        "--cache-dir",
+        str(work_dir / "cache"),
+        "--output",
+        str(work_dir / "machine_pricing.json"),
+    ]
+    cases = {
+        "extract_machines": (
+            extract_machines + ["--force"],
+            cost_dir,
+            inputs["worker_pools"],
+        ),
+        "extract_machines-cached": (extract_machines, cost_dir, inputs["worker_pools"]),
+        "tokenize_input": (
+            [
+                python,
+                str(benchmark_dir / "tokenize_input.py"),
+                str(inputs["corpus"]),
+                "--model",
+                "enes.spm",
+            ],
+            benchmark_dir,
+            inputs["corpus"],
+        ),
+    }
+    for tool in ["taskcluster", "taskgraph"]:
+        command = [python, str(gpt_dir / f"{tool}.py"), *gpt_flags]
+        cases[tool] = (command + ["--full"], inputs[tool], inputs[tool])
+        cases[f"{tool}-noop"] = (command, inputs[tool], inputs[tool])
+    return cases
+
+
+def run_case(name, command, cwd, input_path, log_dir):
+    """
+    Runs the command, and returns its wall time, and the peak RSS from wait4, which
+    covers the process and the children it waited for.
+    """
+    log_path = log_dir / f"{name}.log"
+    with log_path.open("wb") as log:
+        start = time.perf_counter()
+        process = subprocess.Popen(command, cwd=cwd, stdout=log, stderr=log)
+        _, status, rusage = os.wait4(process.pid, 0)
+        seconds = time.perf_counter() - start
+    # Let Popen know the process is gone.
+    process.returncode = os.waitstatus_to_exitcode(status)
+    result = {
+        "case": name,
+        "input_mb": round(tree_bytes(input_path) / 1024 / 1024, 3),
+        "status": "ok" if process.returncode == 0 else "error",
+        "seconds": round(seconds, 3),
+        # ru_maxrss is in kilobytes on Linux, and in bytes on macOS.
+        "peak_rss_mb": round(
+            rusage.ru_maxrss / (1024 * 1024 if sys.platform == "darwin" else 1024), 1
+        ),
+    }
+    if process.returncode != 0:
+        result["error"] = log_path.read_text(errors="replace").strip()[-2000:]
+    return result
+
+
+def run_scale(scale, seed, names, work_dir):
+    # Inputs left over from a previous run would change what is generated.
+    shutil.rmtree(work_dir / "inputs", ignore_errors=True)
+    inputs = generate_inputs(work_dir / "inputs", scale, seed)
+    log_dir = work_dir / "logs"
+    log_dir.mkdir(exist_ok=True)
+    results = []
+    with LocalServer(inputs["worker_pools"].parent) as server:
+        cases = make_cases(inputs, server.url(inputs["worker_pools"].name), work_dir)
+        for name in names:
+            command, cwd, input_path = cases[name]
+            result = run_case(name, command, cwd, input_path, log_dir)
+            result["scale"] = scale
+            results.append(result)
+            print(
+                f"Finished {name} at scale {scale} in {result['seconds']}s",
+                file=sys.stderr,
+            )
+    return results
+
+
+def load_runs(path):
+    return json.loads(path.read_text())["runs"] if path.exists() else []
+
+
+def append_results(path, run):
+    runs = load_runs(path)
+    runs.append(run)
+    path.write_text(json.dumps({"runs": runs}, indent=2))
+
+
+def same_kind(a, b):
+    return a["machine"] == b["machine"] and a["cpu_count"] == b["cpu_count"]
+
+
+def baselines(runs, run, baseline_runs):
+    """
+    The median seconds and peak RSS of the last runs of every case and scale, from
+    the previous runs on the same kind of machine.
+    """
+    history = {}
+    for previous in runs:
+        if not same_kind(previous, run):
+            continue
+        for result in previous["results"]:
+            if result["status"] == "ok":
+                key = (result["case"], result["scale"])
+                history.setdefault(key, []).append(result)
+    baseline = {}
+    for key, results in history.items():
+        last = results[-baseline_runs:]
+        baseline[key] = {
+            "seconds": statistics.median(r["seconds"] for r in last),
+            "peak_rss_mb": statistics.median(r["peak_rss_mb"] for r in last),
+        }
+    return baseline
+
+
+def find_regressions(results, baseline, time_threshold, memory_threshold):
+    """
+    Small absolute changes are ignored, as the runs of the small cases are dominated
+    by the start up of Python.
+    """
+    regressions = []
+    for result in results:
+        base = baseline.get((result["case"], result["scale"]))
+        if base is None or result["status"] != "ok":
+            continue
+        for metric, threshold, noise in (
+            ("seconds", time_threshold, 0.05),
+            ("peak_rss_mb", memory_threshold, 5.0),
+        ):
+            value = result[metric]
+            if value > base[metric] * (1 + threshold) and value - base[metric] > noise:
+                regressions.append(
+                    f"{result['case']} at scale {result['scale']}: {metric} "
+                    f"{value} vs a baseline of {base[metric]}"
+                )
+    return regressions
+
+
+def git_revision():
+    try:
+        return subprocess.run(
+            ["git", "rev-parse", "--short", "HEAD"],
+            cwd=root_dir,
+            check=True,
+            capture_output=True,
+            text=True,
+        ).stdout.strip()
+    except (OSError, subprocess.CalledProcessError):
+        return None
+
+
+def main():
+    parser = argparse.ArgumentParser(
+        description=__doc__, formatter_class=argparse.RawDescriptionHelpFormatter
+    )
+    parser.add_argument("--scales", type=int, nargs="+", default=[1, 10])
+    parser.add_argument("--seed", type=int, default=0)
+    parser.add_argument("--cases", nargs="+", choices=case_names, default=case_names)
+    parser.add_argument(
+        "--time-threshold",
+        type=float,
+        default=0.25,
+        help="The fraction by which a case can be slower than its baseline",
+    )
+    parser.add_argument(
+        "--memory-threshold",
+        type=float,
+        default=0.25,
+        help="The fraction by which the peak RSS can be larger than its baseline",
+    )
+    parser.add_argument(
+        "--baseline-runs",
+        type=int,
+        default=5,
+        help="The number of previous runs that the baseline is the median of",
+    )
+    parser.add_argument("--label", default="", help="A name for this run")
+    parser.add_argument("--output", type=Path, default=results_path)
+    parser.add_argument(
+        "--work-dir",
+        type=Path,
+        help="Keep the inputs, outputs and logs here, instead of a temporary directory",
+    )
+    args = parser.parse_args()
+    # The -cached and -noop cases need the case before them to have run.
+    names = [name for name in case_names if name in args.cases]
+
+    results = []
+    with tempfile.TemporaryDirectory() as tmp:
+        for scale in args.scales:
+            work_dir = (args.work_dir or Path(tmp)) / f"scale-{scale}"
+            results.extend(run_scale(scale, args.seed, names, work_dir))
+
+    run = {
+        "label": args.label,
+        "date": datetime.datetime.now(datetime.timezone.utc).isoformat(),
+        "revision": git_revision(),
+        "seed": args.seed,
+        "python": platform.python_version(),
+        "machine": platform.machine(),
+        "cpu_count": os.cpu_count(),
+        "results": results,
+    }
+    baseline = baselines(load_runs(args.output), run, args.baseline_runs)
+    append_results(args.output, run)
+
+    print(
+        f"{'case':<26}{'scale':>6}{'input MB':>10}{'seconds':>10}{'peak MB':>10}"
+        f"{'vs base':>9}"
+    )
+    for r in results:
+        base = baseline.get((r["case"], r["scale"]))
+        ratio = f"{r['seconds'] / base['seconds']:.2f}x" if base else "-"
+        if r["status"] != "ok":
+            ratio = "error"
+        print(
+            f"{r['case']:<26}{r['scale']:>6}{r['input_mb']:>10}{r['seconds']:>10}"
+            f"{r['peak_rss_mb']:>10}{ratio:>9}"
+        )
+    print(f"Appended the results to {args.output}")
+
+    failures = [r for r in results if r["status"] != "ok"]
+    for r in failures:
+        print(f"\n{r['case']} at scale {r['scale']} failed:\n{r['error']}")
+    regressions = find_regressions(
+        results, baseline, args.time_threshold, args.memory_threshold
+    )
+    if regressions:
+        print("\nRegressions:\n  " + "\n  ".join(regressions))
+    if failures or regressions:
+        sys.exit(1)
+
+
+if __name__ == "__main__":
+    main()
@@ -0,0 +1,384 @@
+"""
+Builds the document for a GPT out of a docs tree: a `tree` listing of the directory,
+then the path, URL and contents of every doc.
+
+The directory is walked once with os.scandir, and both the listing and the list of
+docs come from that walk. The docs are read in a thread pool, a few ahead of the one
+being written, and written to the output in path order as they come in.
+
+A manifest of the build is written next to the output, see docs_manifest.py, so that
+a rebuild only reads the docs that changed since.
+"""
+
+import argparse
+import os
+from collections import deque
+from collections.abc import Callable, Iterator
+from concurrent.futures import ThreadPoolExecutor
+from contextlib import ExitStack
+from dataclasses import dataclass, field
+from pathlib import Path
+from typing import TypeVar
+
+from docs_chunks import (
+    TokenCounter,
+    chunk_dir_for,
+    chunks_up_to_date,
+    default_spm_model,
+    write_chunks,
+)
+from docs_dedup import dedup, dedup_path
+from docs_manifest import (
+    SEPARATOR,
+    Manifest,
+    Section,
+    hash_bytes,
+    load_manifest,
+    save_manifest,
+)
+from docs_search import build_index, index_up_to_date
+from docs_zstd import write_zstd, zstd_path
+
+T = TypeVar("T")
+R = TypeVar("R")
+
+
+@dataclass
+class Entry:
+    name: str
+    path: Path
+    is_dir: bool
+    link_target: str | None = None
+    children: list["Entry"] = field(default_factory=list)
+
+
+def walk(path: Path) -> Entry:
+    """
+    Scans the directory recursively, with the entries of each directory sorted by name.
+    Symlinked directories are listed but not followed.
+    """
+    root = Entry(path.name, path, is_dir=True)
+    with os.scandir(path) as entries:
+        for entry in sorted(entries, key=lambda entry: entry.name):
+            entry_path = path / entry.name
+            if entry.is_dir(follow_symlinks=False):
+                root.children.append(walk(entry_path))
+            else:
+                root.children.append(
+                    Entry(
+                        entry.name,
+                        entry_path,
+                        is_dir=entry.is_dir(),
+                        link_target=(
+                            os.readlink(entry_path) if entry.is_symlink() else None
+                        ),
+                    )
+                )
+    return root
+
+
+def iter_files(root: Entry, include_extensions: set[str]) -> Iterator[Path]:
+    """
+    The docs in the order of sorted(Path), since a parent directory's name sorts before
+    the longer names that start with it.
+    """
+    for entry in root.children:
+        if entry.is_dir and entry.link_target is None:
+            yield from iter_files(entry, include_extensions)
+        elif entry.path.suffix in include_extensions and entry.path.is_file():
+            yield entry.path
+
+
+def render_tree(root: Entry, base_dir: Path) -> str:
+    """
+    Renders the walk like `tree .` run in the directory: hidden entries are left out,
+    and symlinks are shown with their target.
+    """
+    lines = [str(base_dir), "."]
+    counts = {"directories": 0, "files": 0}
+
+    def render(entry: Entry, prefix: str) -> None:
+        children = [child for child in entry.children if not child.name.startswith(".")]
+        for i, child in enumerate(children):
+            last = i == len(children) - 1
+            name = child.name
+            if child.link_target is not None:
+                name += f" -> {child.link_target}"
+            lines.append(prefix + ("└── " if last else "├── ") + name)
+            counts["directories" if child.is_dir else "files"] += 1
+            if child.is_dir and child.link_target is None:
+                render(child, prefix + ("    " if last else "│   "))
+
+    render(root, "")
+    directories = counts["directories"]
+    files = counts["files"]
+    lines.append("")
+    lines.append(
+        f"{directories} director{'y' if directories == 1 else 'ies'}, "
+        f"{files} file{'' if files == 1 else 's'}"
+    )
+    return "\n".join(lines)
+
+
+def read_ahead(
+    items: Iterator[T], read: Callable[[T], R], max_workers: int = 8
+) -> Iterator[tuple[T, R]]:
+    """
+    Reads the items in a thread pool, and yields them in order. Only a few items are
+    read ahead, so memory is bounded by the largest files and not the whole tree.
+    """
+    max_in_flight = max_workers * 2
+    with ThreadPoolExecutor(max_workers=max_workers) as executor:
+        pending: deque = deque()
+        for item in items:
+            pending.append((item, executor.submit(read, item)))
+            if len(pending) >= max_in_flight:
+                item, future = pending.popleft()
+                yield item, future.result()
+        while pending:
+            item, future = pending.popleft()
+            yield item, future.result()
+
+
+@dataclass
+class Doc:
+    path: Path
+    relative_path: Path
+    url: str
+    mtime_ns: int
+    size: int
+    previous: Section | None
+
+    @property
+    def unchanged(self) -> bool:
+        """Whether the previous section can be reused without reading the doc."""
+        return (
+            self.previous is not None
+            and self.previous.url == self.url
+            and self.previous.mtime_ns == self.mtime_ns
+            and self.previous.size == self.size
+        )
+
+
+@dataclass
+class BuildStats:
+    docs: int = 0
+    reused: int = 0
+    rendered: int = 0
+    removed: int = 0
+    written: bool = True
+
+    def summary(self) -> str:
+        if not self.written:
+            return f"{self.docs} docs, all unchanged, the output is up to date"
+        return (
+            f"{self.docs} docs, {self.rendered} read, {self.reused} reused, "
+            f"{self.removed} removed"
+        )
+
+
+def read_doc(doc: Doc) -> bytes | None:
+    return None if doc.unchanged else doc.path.read_bytes()
+
+
+def render_section(doc: Doc, data: bytes) -> bytes:
+    # Translates newlines the same way as Path.read_text.
+    text = data.decode("utf-8").replace("\r\n", "\n").replace("\r", "\n")
+    return SEPARATOR.join((str(doc.relative_path), doc.url, text)).encode("utf-8")
+
+
+def build(
+    base_dir: Path,
+    output_file: Path,
+    include_extensions: set[str],
+    url_for: Callable[[Path], str],
+    max_workers: int = 8,
+    full: bool = False,
+) -> BuildStats:
+    """
+    Writes the tree, and then the relative path, the URL from `url_for(relative_path)`
+    and the contents of every doc, separated by blank lines.
+
+    Unless `full` is set, the manifest of the previous build is used to only read the
+    docs whose mtime or size changed, and to copy the sections of the others from the
+    previous output. When nothing changed, the output isn't written at all.
+    """
+    root = walk(base_dir)
+    tree = render_tree(root, base_dir).encode("utf-8")
+    previous = None if full else load_manifest(output_file)
+    previous_sections = (
+        {section.path: section for section in previous.sections} if previous else {}
+    )
+
+    docs = []
+    for path in iter_files(root, include_extensions):
+        relative_path = path.relative_to(base_dir)
+        stat = path.stat()
+        docs.append(
+            Doc(
+                path,
+                relative_path,
+                url_for(relative_path),
+                stat.st_mtime_ns,
+                stat.st_size,
+                previous_sections.get(str(relative_path)),
+            )
+        )
+
+    stats = BuildStats(docs=len(docs))
+    paths = {str(doc.relative_path) for doc in docs}
+    stats.removed = len(previous_sections.keys() - paths)
+    if (
+        previous is not None
+        and previous.tree_hash == hash_bytes(tree)
+        and [doc.previous for doc in docs] == previous.sections
+        and all(doc.unchanged for doc in docs)
+    ):
+        stats.reused = len(docs)
+        stats.written = False
+        return stats
+
+    manifest = Manifest(
+        output_size=0,
+        output_mtime_ns=0,
+        tree_hash=hash_bytes(tree),
+        tree_length=len(tree),
+    )
+    separator = SEPARATOR.encode("utf-8")
+    tmp_file = output_file.with_name(output_file.name + ".tmp")
+    with ExitStack() as stack:
+        out = stack.enter_context(tmp_file.open("wb"))
+        old = stack.enter_context(output_file.open("rb")) if previous else None
+        out.write(tree)
+        out.write(separator)
+        for i, (doc, data) in enumerate(read_ahead(iter(docs), read_doc, max_workers)):
+            if i:
+                out.write(separator)
+            if data is None:
+                assert old is not None and doc.previous is not None
+                old.seek(doc.previous.offset)
+                section = old.read(doc.previous.length)
+                content_hash = doc.previous.hash
+                stats.reused += 1
+            else:
+                section = render_section(doc, data)
+                content_hash = hash_bytes(data)
+                stats.rendered += 1
+            manifest.sections.append(
+                Section(
+                    path=str(doc.relative_path),
+                    url=doc.url,
+                    mtime_ns=doc.mtime_ns,
+                    size=doc.size,
+                    hash=content_hash,
+                    offset=out.tell(),
+                    length=len(section),
+                )
+            )
+            out.write(section)
+    tmp_file.replace(output_file)
+
+    stat = output_file.stat()
+    manifest.output_size = stat.st_size
+    manifest.output_mtime_ns = stat.st_mtime_ns
+    save_manifest(output_file, manifest)
+    return stats
+
+
+def is_newer(path: Path, than: Path) -> bool:
+    try:
+        return path.stat().st_mtime_ns >= than.stat().st_mtime_ns
+    except OSError:
+        return False
+
+
+def main(
+    base_dir: Path,
+    output_file: Path,
+    include_extensions: set[str],
+    url_for: Callable[[Path], str],
+) -> None:
+    parser = argparse.ArgumentParser(description=__doc__)
+    parser.add_argument(
+        "--full",
+        action="store_true",
+        help="Ignore the manifest of the previous build and read every doc.",
+    )
+    parser.add_argument("--workers", type=int, default=8)
+    parser.add_argument(
+        "--chunk-tokens",
+        type=int,
+        metavar="N",
+        help="Also split the output into chunks of at most N tokens, with an index.",
+    )
+    parser.add_argument(
+        "--spm-model",
+        type=Path,
+        default=default_spm_model(),
+        help="The SentencePiece model to count the tokens of the chunks with, "
+        "src/benchmark/enes.spm by default. Without a model, tokens are estimated "
+        "from the number of characters.",
+    )
+    parser.add_argument(
+        "--dedup",
+        action="store_true",
+        help="Also write a copy without the near-duplicate docs and paragraphs, "
+        "which is then the one that is chunked and indexed.",
+    )
+    parser.add_argument(
+        "--search-index",
+        action="store_true",
+        help="Also write a BM25 search index of the docs, see docs_search.py.",
+    )
+    parser.add_argument(
+        "--zstd",
+        action="store_true",
+        help="Also write a seekable zstd copy, with a frame per doc, see docs_zstd.py.",
+    )
+    args = parser.parse_args()
+
+    stats = build(
+        base_dir,
+        output_file,
+        include_extensions,
+        url_for,
+        max_workers=args.workers,
+        full=args.full,
+    )
+    print(f"{output_file}: {stats.summary()}")
+
+    counter = TokenCounter(args.spm_model)
+    corpus_file = output_file
+    changed = stats.written
+    if args.dedup:
+        corpus_file = dedup_path(output_file)
+        # The output can also have been rewritten by an earlier run without --dedup.
+        if (
+            changed
+            or load_manifest(corpus_file) is None
+            or not is_newer(corpus_file, output_file)
+        ):
+            changed = True
+            dedup_stats = dedup(output_file, counter, corpus_file)
+            print(f"{corpus_file}: {dedup_stats.summary()}")
+
+    if args.chunk_tokens:
+        chunk_dir = chunk_dir_for(corpus_file)
+        if changed or not chunks_up_to_date(
+            corpus_file, chunk_dir, args.chunk_tokens, counter
+        ):
+            chunks = write_chunks(corpus_file, args.chunk_tokens, counter, chunk_dir)
+            print(
+                f"{chunk_dir}: {len(chunks)} chunks, "
+                f"{sum(chunk.tokens for chunk in chunks)} tokens ({counter.name})"
+            )
+
+    if args.search_index and (changed or not index_up_to_date(corpus_file)):
+        terms = build_index(corpus_file)
+        print(f"{corpus_file}: indexed {stats.docs} docs, {terms} terms")
+
+    if args.zstd:
+        path = zstd_path(corpus_file)
+        if changed or not is_newer(path, corpus_file):
+            write_zstd(corpus_file, path)
+            print(f"{path}: {path.stat().st_size:,} bytes, a frame per doc")
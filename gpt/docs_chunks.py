@@ -0,0 +1,273 @@
+"""
+Splits a docs build into chunks under a token budget, so that a model can be given
+only the chunks it needs instead of the whole output.
+
+Docs are packed together into a chunk while they fit. A doc that doesn't fit in one
+chunk is split at its Markdown and reStructuredText headings, then at paragraphs and
+then at lines, and every part repeats the path and URL of the doc. The chunks are
+written as chunk-0001.txt, chunk-0002.txt, ... in a directory next to the output,
+with an index.json of the token count of every chunk, and the path, URL, token count
+and byte range of every section in it.
+
+Tokens are counted with a SentencePiece model when sentencepiece is installed, by
+default the src/benchmark/enes.spm model of this repo, and are only estimated from the
+number of characters when there is no model, e.g. when the script was copied elsewhere.
+"""
+
+import importlib.util
+import json
+import re
+import sys
+from collections.abc import Callable, Iterator
+from dataclasses import asdict, dataclass, field
+from pathlib import Path
+
+from docs_manifest import SEPARATOR, iter_sections
+
+CHARS_PER_TOKEN = 4
+DEFAULT_SPM_MODEL = Path(__file__).resolve().parent.parent / "src/benchmark/enes.spm"
+
+MARKDOWN_HEADING = re.compile(r"#{1,6}\s")
+MARKDOWN_FENCE = re.compile(r"(```|~~~)")
+RST_ADORNMENT = re.compile(r"""([=\-~^"'`*+#:.])\1{2,}\s*""")
+
+
+def default_spm_model() -> Path | None:
+    return DEFAULT_SPM_MODEL if DEFAULT_SPM_MODEL.exists() else None
+
+
+class TokenCounter:
+    """
+    The model is only loaded on the first count, so that a build with nothing to
+    chunk doesn't pay for it.
+    """
+
+    def __init__(self, model_file: Path | None = None):
+        self.model_file = None
+        self.processor = None
+        self.name = f"estimate:{CHARS_PER_TOKEN}-chars-per-token"
+        if model_file is None:
+            return
+        if importlib.util.find_spec("sentencepiece") is None:
+            print(
+                "sentencepiece isn't installed, so tokens are estimated: "
+                "pip install sentencepiece",
+                file=sys.stderr,
+            )
+            return
+        self.model_file = Path(model_file)
+        self.name = f"sentencepiece:{self.model_file.name}"
+
+    def count(self, text: str) -> int:
+        if self.model_file is None:
+            return -(-len(text) // CHARS_PER_TOKEN)
+        if self.processor is None:
+            import sentencepiece as spm
+
+            self.processor = spm.SentencePieceProcessor(model_file=str(self.model_file))
+        return len(self.processor.encode(text))
+
+
+def heading_starts(lines: list[str]) -> Iterator[int]:
+    """
+    The indexes of the lines that start a section: Markdown headings outside of code
+    fences, and reStructuredText titles, along with their overline when they have one.
+    """
+    in_fence = False
+    for i, line in enumerate(lines):
+        if MARKDOWN_FENCE.match(line):
+            in_fence = not in_fence
+        elif in_fence:
+            continue
+        elif MARKDOWN_HEADING.match(line):
+            yield i
+        elif (
+            i + 1 < len(lines)
+            and line.strip()
+            and not RST_ADORNMENT.fullmatch(line)
+            and RST_ADORNMENT.fullmatch(lines[i + 1])
+            and len(lines[i + 1].rstrip()) >= len(line.rstrip())
+        ):
+            yield i - 1 if i > 0 and lines[i - 1] == lines[i + 1] else i
+
+
+def split_at(text: str, starts: list[int]) -> list[str]:
+    lines = text.splitlines(keepends=True)
+    bounds = [0, *starts, len(lines)]
+    return [
+        "".join(lines[start:end])
+        for start, end in zip(bounds, bounds[1:])
+        if end > start
+    ]
+
+
+def split_headings(text: str) -> list[str]:
+    return split_at(text, list(heading_starts(text.splitlines())))
+
+
+def split_paragraphs(text: str) -> list[str]:
+    parts = re.split(r"(?<=\n\n)(?=[^\n])", text)
+    return [part for part in parts if part]
+
+
+def split_lines(text: str) -> list[str]:
+    return text.splitlines(keepends=True)
+
+
+def split_chars(text: str, max_chars: int) -> list[str]:
+    return [text[i : i + max_chars] for i in range(0, len(text), max_chars)]
+
+
+SPLITTERS: list[Callable[[str], list[str]]] = [
+    split_headings,
+    split_paragraphs,
+    split_lines,
+]
+
+
+def split_to_budget(
+    text: str, counter: TokenCounter, budget: int, level: int = 0
+) -> list[tuple[str, int]]:
+    """
+    Splits the text into pieces of at most `budget` tokens, at the coarsest boundaries
+    that get them under it, and returns the pieces with their token count.
+    """
+    tokens = counter.count(text)
+    if tokens <= budget:
+        return [(text, tokens)]
+    if level == len(SPLITTERS):
+        max_chars = max(1, len(text) * budget // tokens)
+        return [(part, counter.count(part)) for part in split_chars(text, max_chars)]
+    parts = SPLITTERS[level](text)
+    if len(parts) == 1:
+        return split_to_budget(text, counter, budget, level + 1)
+    pieces = []
+    for part in parts:
+        pieces.extend(split_to_budget(part, counter, budget, level + 1))
+    return pieces
+
+
+def pack(pieces: list[tuple[str, int]], budget: int) -> list[str]:
+    """Joins consecutive pieces while they fit in the budget."""
+    packed: list[str] = []
+    current: list[str] = []
+    current_tokens = 0
+    for text, tokens in pieces:
+        if current and current_tokens + tokens > budget:
+            packed.append("".join(current))
+            current, current_tokens = [], 0
+        current.append(text)
+        current_tokens += tokens
+    if current:
+        packed.append("".join(current))
+    return packed
+
+
+@dataclass
+class ChunkSection:
+    path: str
+    url: str
+    part: int
+    tokens: int
+    offset: int
+    length: int
+
+
+@dataclass
+class Chunk:
+    file: str
+    tokens: int = 0
+    bytes: int = 0
+    sections: list[ChunkSection] = field(default_factory=list)
+
+
+def chunk_dir_for(output_file: Path) -> Path:
+    return output_file.with_name(output_file.stem + ".chunks")
+
+
+def chunks_up_to_date(
+    output_file: Path, chunk_dir: Path, budget: int, counter: TokenCounter
+) -> bool:
+    """
+    Whether the index was written from the output as it is now, with the same budget
+    and tokenizer.
+    """
+    try:
+        index = json.loads((chunk_dir / "index.json").read_text(encoding="utf-8"))
+        stat = output_file.stat()
+    except (OSError, ValueError):
+        return False
+    return (
+        index.get("source_mtime_ns") == stat.st_mtime_ns
+        and index.get("source_size") == stat.st_size
+        and index.get("budget") == budget
+        and index.get("tokenizer") == counter.name
+    )
+
+
+def write_chunks(
+    output_file: Path, budget: int, counter: TokenCounter, chunk_dir: Path | None = None
+) -> list[Chunk]:
+    chunk_dir = chunk_dir or chunk_dir_for(output_file)
+    chunk_dir.mkdir(parents=True, exist_ok=True)
+    source = output_file.stat()
+    for stale in chunk_dir.glob("chunk-*.txt"):
+        stale.unlink()
+
+    # Every section is counted once, so packing sections into a chunk sums their
+    # counts, which is close to, but not exactly, the count of the joined text.
+    separator_tokens = counter.count(SEPARATOR)
+    segments: list[tuple[str, str, int, str, int]] = []
+    for path, url, body in iter_sections(output_file):
+        header = path + SEPARATOR + url + SEPARATOR if url else ""
+        body_budget = max(1, budget - counter.count(header) - separator_tokens)
+        pieces = split_to_budget(body, counter, body_budget)
+        for part, text in enumerate(pack(pieces, body_budget)):
+            segment = header + text
+            segments.append((path, url, part, segment, counter.count(segment)))
+
+    chunks: list[Chunk] = []
+    current: list[tuple[str, str, int, str, int]] = []
+
+    def flush() -> None:
+        chunk = Chunk(f"chunk-{len(chunks) + 1:04}.txt")
+        with (chunk_dir / chunk.file).open("wb") as out:
+            for i, (path, url, part, segment, tokens) in enumerate(current):
+                if i:
+                    out.write(SEPARATOR.encode("utf-8"))
+                data = segment.encode("utf-8")
+                chunk.sections.append(
+                    ChunkSection(path, url, part, tokens, out.tell(), len(data))
+                )
+                out.write(data)
+                chunk.tokens += tokens + (separator_tokens if i else 0)
+            chunk.bytes = out.tell()
+        chunks.append(chunk)
+        current.clear()
+
+    current_tokens = 0
+    for segment in segments:
+        tokens = segment[4] + (separator_tokens if current else 0)
+        if current and current_tokens + tokens > budget:
+            flush()
+            current_tokens, tokens = 0, segment[4]
+        current.append(segment)
+        current_tokens += tokens
+    if current:
+        flush()
+
+    (chunk_dir / "index.json").write_text(
+        json.dumps(
+            {
+                "source": output_file.name,
+                "source_mtime_ns": source.st_mtime_ns,
+                "source_size": source.st_size,
+                "budget": budget,
+                "tokenizer": counter.name,
+                "chunks": [asdict(chunk) for chunk in chunks],
+            },
+            indent=1,
+        ),
+        encoding="utf-8",
+    )
+    return chunks
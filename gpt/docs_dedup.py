@@ -0,0 +1,199 @@
+"""
+Removes the near-duplicate docs and paragraphs of a build, such as repeated reference
+tables, API sections and versioned copies of pages, and writes the result next to the
+output as a .dedup file with its own manifest.
+
+The first copy is kept, and the others, when longer than a few lines, are replaced with
+a reference to the URL of the doc it is in. Docs and paragraphs are shingled into word
+5-grams, and summarized with a one permutation MinHash: every shingle is hashed once,
+into one of the bins of the signature, which keeps the smallest hash of each. Signatures
+are split into bands that are looked up in a hash table of the kept copies, so only the
+copies that share a band are compared, and the cost grows with the number of sections
+rather than its square.
+"""
+
+import hashlib
+import re
+from collections.abc import Iterator
+from dataclasses import dataclass
+from pathlib import Path
+
+from docs_chunks import TokenCounter
+from docs_manifest import (
+    SEPARATOR,
+    Manifest,
+    Section,
+    load_manifest,
+    save_manifest,
+)
+
+SHINGLE_WORDS = 5
+BINS = 64
+BANDS = 16
+THRESHOLD = 0.8
+MIN_CHARS = 300
+MAX_HASH = (1 << 64) - 1
+
+WORD = re.compile(r"\w+")
+PARAGRAPH_BREAK = re.compile(r"(?<=\n\n)(?=[^\n])")
+
+
+def shingles(text: str) -> Iterator[bytes]:
+    words = WORD.findall(text.lower())
+    for i in range(max(1, len(words) - SHINGLE_WORDS + 1)):
+        yield " ".join(words[i : i + SHINGLE_WORDS]).encode("utf-8")
+
+
+def signature(text: str) -> tuple[int, ...]:
+    """
+    A one permutation MinHash. Bins without a shingle borrow the value of the next bin
+    that has one, so that two texts only agree on a bin when they share a shingle.
+    """
+    bins = [MAX_HASH] * BINS
+    for shingle in shingles(text):
+        digest = hashlib.blake2b(shingle, digest_size=8).digest()
+        value = int.from_bytes(digest, "little")
+        i = value % BINS
+        if value < bins[i]:
+            bins[i] = value
+    filled = [i for i, value in enumerate(bins) if value != MAX_HASH]
+    if filled and len(filled) < BINS:
+        for i in range(BINS):
+            if bins[i] == MAX_HASH:
+                donor = next((j for j in filled if j > i), filled[0])
+                bins[i] = bins[donor] + (i - donor) % BINS
+    return tuple(bins)
+
+
+def similarity(a: tuple[int, ...], b: tuple[int, ...]) -> float:
+    return sum(x == y for x, y in zip(a, b)) / BINS
+
+
+class NearDuplicates:
+    """The kept copies, indexed by the bands of their signature."""
+
+    def __init__(self):
+        self.buckets: dict[tuple[int, tuple[int, ...]], list[int]] = {}
+        self.signatures: list[tuple[int, ...]] = []
+        self.labels: list[str] = []
+
+    def bands(self, sig: tuple[int, ...]) -> Iterator[tuple[int, tuple[int, ...]]]:
+        rows = BINS // BANDS
+        for band in range(BANDS):
+            yield band, sig[band * rows : (band + 1) * rows]
+
+    def find_or_add(self, text: str, label: str) -> str | None:
+        """
+        The label of the kept copy that the text nearly duplicates, or None when there
+        isn't one, in which case the text is kept under the label.
+        """
+        sig = signature(text)
+        seen = set()
+        for key in self.bands(sig):
+            for i in self.buckets.get(key, ()):
+                if i not in seen:
+                    seen.add(i)
+                    if similarity(sig, self.signatures[i]) >= THRESHOLD:
+                        return self.labels[i]
+        i = len(self.signatures)
+        self.signatures.append(sig)
+        self.labels.append(label)
+        for key in self.bands(sig):
+            self.buckets.setdefault(key, []).append(i)
+        return None
+
+
+@dataclass
+class DedupStats:
+    docs: int = 0
+    paragraphs: int = 0
+    bytes_saved: int = 0
+    tokens_saved: int = 0
+
+    def summary(self) -> str:
+        return (
+            f"{self.docs} duplicate docs and {self.paragraphs} duplicate paragraphs, "
+            f"{self.bytes_saved:,} bytes and ~{self.tokens_saved:,} tokens saved"
+        )
+
+
+def dedup_path(output_file: Path) -> Path:
+    return output_file.with_name(output_file.stem + ".dedup" + output_file.suffix)
+
+
+def dedup(
+    output_file: Path, counter: TokenCounter, dedup_file: Path | None = None
+) -> DedupStats:
+    manifest = load_manifest(output_file)
+    if manifest is None:
+        raise SystemExit(f"{output_file} has no up to date manifest, run a build first")
+    dedup_file = dedup_file or dedup_path(output_file)
+    stats = DedupStats()
+    docs = NearDuplicates()
+    paragraphs = NearDuplicates()
+
+    def replace(text: str, reference: str) -> str:
+        stats.bytes_saved += len(text.encode("utf-8")) - len(reference.encode("utf-8"))
+        stats.tokens_saved += counter.count(text) - counter.count(reference)
+        return reference
+
+    deduped = Manifest(
+        output_size=0,
+        output_mtime_ns=0,
+        tree_hash=manifest.tree_hash,
+        tree_length=manifest.tree_length,
+    )
+    separator = SEPARATOR.encode("utf-8")
+    tmp_file = dedup_file.with_name(dedup_file.name + ".tmp")
+    with output_file.open("rb") as f, tmp_file.open("wb") as out:
+        out.write(f.read(manifest.tree_length))
+        out.write(separator)
+        for i, section in enumerate(manifest.sections):
+            f.seek(section.offset)
+            text = f.read(section.length).decode("utf-8")
+            header = section.path + SEPARATOR + section.url + SEPARATOR
+            body = text[len(header) :]
+
+            canonical = (
+                docs.find_or_add(body, section.url) if len(body) >= MIN_CHARS else None
+            )
+            if canonical is not None:
+                stats.docs += 1
+                body = replace(body, f"[Nearly the same as {canonical}]\n")
+            else:
+                parts = PARAGRAPH_BREAK.split(body)
+                for j, paragraph in enumerate(parts):
+                    if len(paragraph) < MIN_CHARS:
+                        continue
+                    canonical = paragraphs.find_or_add(paragraph, section.url)
+                    if canonical is not None:
+                        stats.paragraphs += 1
+                        where = "" if canonical == section.url else f" in {canonical}"
+                        ending = "\n\n" if paragraph.endswith("\n\n") else "\n"
+                        parts[j] = replace(
+                            paragraph, f"[Same as a paragraph above{where}]{ending}"
+                        )
+                body = "".join(parts)
+
+            data = (header + body).encode("utf-8")
+            if i:
+                out.write(separator)
+            deduped.sections.append(
+                Section(
+                    path=section.path,
+                    url=section.url,
+                    mtime_ns=section.mtime_ns,
+                    size=section.size,
+                    hash=section.hash,
+                    offset=out.tell(),
+                    length=len(data),
+                )
+            )
+            out.write(data)
+    tmp_file.replace(dedup_file)
+
+    stat = dedup_file.stat()
+    deduped.output_size = stat.st_size
+    deduped.output_mtime_ns = stat.st_mtime_ns
+    save_manifest(dedup_file, deduped)
+    return stats
@@ -0,0 +1,95 @@
+"""
+The manifest of a docs build, written next to the output. It records the path, mtime,
+size and hash of every doc, along with the byte range of its section in the output, so
+that a rebuild only has to read the docs that changed, and can copy the sections of the
+others out of the previous output.
+"""
+
+import hashlib
+import json
+import os
+from collections.abc import Iterator
+from dataclasses import asdict, dataclass, field
+from pathlib import Path
+
+VERSION = 1
+SEPARATOR = "\n\n"
+
+
+@dataclass
+class Section:
+    path: str
+    url: str
+    mtime_ns: int
+    size: int
+    hash: str
+    offset: int
+    length: int
+
+
+@dataclass
+class Manifest:
+    output_size: int
+    output_mtime_ns: int
+    tree_hash: str
+    tree_length: int
+    sections: list[Section] = field(default_factory=list)
+
+
+def hash_bytes(data: bytes) -> str:
+    return hashlib.blake2b(data, digest_size=16).hexdigest()
+
+
+def manifest_path(output_file: Path) -> Path:
+    return output_file.with_name(output_file.name + ".manifest.json")
+
+
+def load_manifest(output_file: Path) -> Manifest | None:
+    """
+    The manifest of the output, or None when there isn't one, or when the output was
+    changed or removed since the manifest was written.
+    """
+    try:
+        data = json.loads(manifest_path(output_file).read_text(encoding="utf-8"))
+        stat = output_file.stat()
+    except (OSError, ValueError):
+        return None
+    if data.get("version") != VERSION:
+        return None
+    manifest = Manifest(
+        output_size=data["output_size"],
+        output_mtime_ns=data["output_mtime_ns"],
+        tree_hash=data["tree_hash"],
+        tree_length=data["tree_length"],
+        sections=[Section(**section) for section in data["sections"]],
+    )
+    if (stat.st_size, stat.st_mtime_ns) != (
+        manifest.output_size,
+        manifest.output_mtime_ns,
+    ):
+        return None
+    return manifest
+
+
+def save_manifest(output_file: Path, manifest: Manifest) -> None:
+    path = manifest_path(output_file)
+    tmp_file = path.with_name(path.name + ".tmp")
+    tmp_file.write_text(
+        json.dumps({"version": VERSION, **asdict(manifest)}, indent=1),
+        encoding="utf-8",
+    )
+    os.replace(tmp_file, path)
+
+
+def iter_sections(output_file: Path) -> Iterator[tuple[str, str, str]]:
+    """The path, URL and body of every doc in a build, read through its manifest."""
+    manifest = load_manifest(output_file)
+    if manifest is None:
+        raise SystemExit(f"{output_file} has no up to date manifest, run a build first")
+    with output_file.open("rb") as f:
+        yield ".", "", f.read(manifest.tree_length).decode("utf-8")
+        for section in manifest.sections:
+            f.seek(section.offset)
+            text = f.read(section.length).decode("utf-8")
+            header = section.path + SEPARATOR + section.url + SEPARATOR
+            yield section.path, section.url, text[len(header) :]
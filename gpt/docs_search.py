@@ -0,0 +1,305 @@
+"""
+A BM25 search index over the docs of a build, so that only the docs relevant to a
+question need to be sent to a model, instead of the whole output.
+
+    python docs_search.py docs-taskgraph.txt "fetch artifacts from a decision task"
+    python docs_search.py docs-taskgraph.txt "listTaskGroup" -k 3 --text
+
+The index is written next to the output as a .search.bin file, which is memory mapped
+when queried, along with a .search.json of the path, URL and byte range of every doc.
+Only the postings of the query terms are read, so a query takes a few milliseconds
+however large the docs are.
+
+The .search.bin file is a header, followed by arrays of little-endian unsigned 32 bit
+integers, and the terms as UTF-8, padded to 4 bytes:
+
+    magic, version, docs, terms, postings, average doc length (float)
+    term_starts[terms + 1]      The byte ranges of the terms in the terms blob.
+    posting_starts[terms + 1]   The ranges of the postings of every term.
+    doc_ids[postings]
+    term_frequencies[postings]
+    doc_lengths[docs]
+    terms blob                  The terms, sorted by their UTF-8 bytes.
+"""
+
+import argparse
+import heapq
+import json
+import math
+import mmap
+import re
+import struct
+import sys
+import time
+from array import array
+from bisect import bisect_left
+from collections import Counter
+from dataclasses import asdict, dataclass
+from pathlib import Path
+
+from docs_manifest import SEPARATOR, load_manifest
+
+MAGIC = b"BM25"
+VERSION = 1
+HEADER = struct.Struct("<4sIIIIf")
+K1 = 1.2
+B = 0.75
+
+WORD = re.compile(r"\w+")
+CAMEL_CASE = re.compile(r"[a-z]+|[A-Z][a-z]*|\d+")
+
+
+def tokenize(text: str) -> list[str]:
+    """
+    Lower case words. camelCase and snake_case identifiers, such as API methods, are
+    indexed both whole and by their parts.
+    """
+    terms = []
+    for word in WORD.findall(text):
+        terms.append(word.lower())
+        parts = [
+            part for chunk in word.split("_") for part in CAMEL_CASE.findall(chunk)
+        ]
+        if len(parts) > 1:
+            terms.extend(part.lower() for part in parts)
+    return terms
+
+
+def index_paths(output_file: Path) -> tuple[Path, Path]:
+    return (
+        output_file.with_name(output_file.stem + ".search.bin"),
+        output_file.with_name(output_file.stem + ".search.json"),
+    )
+
+
+def build_index(output_file: Path) -> int:
+    """Indexes every doc of the build, and returns the number of terms."""
+    manifest = load_manifest(output_file)
+    if manifest is None:
+        raise SystemExit(f"{output_file} has no up to date manifest, run a build first")
+
+    postings: dict[str, list[tuple[int, int]]] = {}
+    doc_lengths = array("I")
+    with output_file.open("rb") as f:
+        for doc_id, section in enumerate(manifest.sections):
+            f.seek(section.offset)
+            text = f.read(section.length).decode("utf-8")
+            # The URL is left out, its terms are in every doc.
+            body = text[len(section.path + SEPARATOR + section.url + SEPARATOR) :]
+            terms = tokenize(section.path + " " + body)
+            doc_lengths.append(len(terms))
+            for term, frequency in Counter(terms).items():
+                postings.setdefault(term, []).append((doc_id, frequency))
+
+    terms = sorted(postings, key=lambda term: term.encode("utf-8"))
+    term_starts = array("I", [0])
+    posting_starts = array("I", [0])
+    doc_ids = array("I")
+    term_frequencies = array("I")
+    blob = bytearray()
+    for term in terms:
+        blob += term.encode("utf-8")
+        term_starts.append(len(blob))
+        for doc_id, frequency in postings[term]:
+            doc_ids.append(doc_id)
+            term_frequencies.append(frequency)
+        posting_starts.append(len(doc_ids))
+    blob += b"\0" * (-len(blob) % 4)
+
+    docs = len(manifest.sections)
+    average_length = sum(doc_lengths) / docs if docs else 0.0
+    bin_path, json_path = index_paths(output_file)
+    with bin_path.open("wb") as out:
+        out.write(
+            HEADER.pack(MAGIC, VERSION, docs, len(terms), len(doc_ids), average_length)
+        )
+        for values in (
+            term_starts,
+            posting_starts,
+            doc_ids,
+            term_frequencies,
+            doc_lengths,
+        ):
+            if sys.byteorder == "big":
+                values.byteswap()
+            out.write(values.tobytes())
+        out.write(blob)
+    json_path.write_text(
+        json.dumps(
+            {
+                "source": output_file.name,
+                "docs": [
+                    {
+                        "path": section.path,
+                        "url": section.url,
+                        "offset": section.offset,
+                        "length": section.length,
+                    }
+                    for section in manifest.sections
+                ],
+            },
+            indent=1,
+        ),
+        encoding="utf-8",
+    )
+    return len(terms)
+
+
+def index_up_to_date(output_file: Path) -> bool:
+    try:
+        output_mtime = output_file.stat().st_mtime_ns
+        return all(
+            path.stat().st_mtime_ns >= output_mtime for path in index_paths(output_file)
+        )
+    except OSError:
+        return False
+
+
+@dataclass
+class Hit:
+    path: str
+    url: str
+    score: float
+    offset: int
+    length: int
+
+
+class SearchIndex:
+    def __init__(self, output_file: Path):
+        self.output_file = output_file
+        bin_path, json_path = index_paths(output_file)
+        self.docs = json.loads(json_path.read_text(encoding="utf-8"))["docs"]
+        with bin_path.open("rb") as f:
+            self.mmap = mmap.mmap(f.fileno(), 0, access=mmap.ACCESS_READ)
+        magic, version, docs, terms, postings, self.average_length = HEADER.unpack_from(
+            self.mmap
+        )
+        if magic != MAGIC or version != VERSION:
+            raise SystemExit(f"{bin_path} isn't a search index this script can read")
+
+        view = memoryview(self.mmap)
+        offset = HEADER.size
+
+        def take(count: int) -> memoryview:
+            nonlocal offset
+            values = view[offset : offset + count * 4].cast("I")
+            offset += count * 4
+            if sys.byteorder == "big":
+                # The file is little-endian, so it's read into a swapped copy.
+                swapped = array("I", values)
+                values.release()
+                swapped.byteswap()
+                values = memoryview(swapped)
+            return values
+
+        self.term_starts = take(terms + 1)
+        self.posting_starts = take(terms + 1)
+        self.doc_ids = take(postings)
+        self.term_frequencies = take(postings)
+        self.doc_lengths = take(docs)
+        self.terms = view[offset:]
+        self.doc_count = docs
+        self.term_count = terms
+
+    def close(self) -> None:
+        for values in (
+            self.term_starts,
+            self.posting_starts,
+            self.doc_ids,
+            self.term_frequencies,
+            self.doc_lengths,
+            self.terms,
+        ):
+            values.release()
+        self.mmap.close()
+
+    def __enter__(self):
+        return self
+
+    def __exit__(self, *exc):
+        self.close()
+
+    def term_at(self, i: int) -> bytes:
+        return bytes(self.terms[self.term_starts[i] : self.term_starts[i + 1]])
+
+    def find_term(self, term: str) -> int | None:
+        key = term.encode("utf-8")
+        i = bisect_left(range(self.term_count), key, key=self.term_at)
+        if i < self.term_count and self.term_at(i) == key:
+            return i
+        return None
+
+    def search(self, query: str, k: int = 10) -> list[Hit]:
+        scores: dict[int, float] = {}
+        for term in set(tokenize(query)):
+            i = self.find_term(term)
+            if i is None:
+                continue
+            start, end = self.posting_starts[i], self.posting_starts[i + 1]
+            docs = end - start
+            idf = math.log(1 + (self.doc_count - docs + 0.5) / (docs + 0.5))
+            for j in range(start, end):
+                doc_id = self.doc_ids[j]
+                frequency = self.term_frequencies[j]
+                norm = K1 * (
+                    1 - B + B * self.doc_lengths[doc_id] / (self.average_length or 1)
+                )
+                scores[doc_id] = scores.get(doc_id, 0.0) + idf * frequency * (
+                    K1 + 1
+                ) / (frequency + norm)
+        top = heapq.nlargest(k, scores.items(), key=lambda item: item[1])
+        return [
+            Hit(
+                path=self.docs[doc_id]["path"],
+                url=self.docs[doc_id]["url"],
+                score=score,
+                offset=self.docs[doc_id]["offset"],
+                length=self.docs[doc_id]["length"],
+            )
+            for doc_id, score in top
+        ]
+
+    def read(self, hit: Hit) -> str:
+        with self.output_file.open("rb") as f:
+            f.seek(hit.offset)
+            return f.read(hit.length).decode("utf-8")
+
+
+def main():
+    parser = argparse.ArgumentParser(
+        description=__doc__, formatter_class=argparse.RawDescriptionHelpFormatter
+    )
+    parser.add_argument("output_file", type=Path, help="The output of a docs build.")
+    parser.add_argument("query")
+    parser.add_argument("-k", type=int, default=5, help="The number of docs to return.")
+    parser.add_argument(
+        "--text", action="store_true", help="Print the docs, not only their URLs."
+    )
+    parser.add_argument(
+        "--json", action="store_true", help="Print the hits as JSON, with their text."
+    )
+    args = parser.parse_args()
+
+    start = time.perf_counter()
+    with SearchIndex(args.output_file) as index:
+        hits = index.search(args.query, args.k)
+        elapsed = time.perf_counter() - start
+        if args.json:
+            print(
+                json.dumps(
+                    [{**asdict(hit), "text": index.read(hit)} for hit in hits],
+                    indent=2,
+                )
+            )
+            return
+        for hit in hits:
+            print(f"{hit.score:7.2f}  {hit.url}")
+            if args.text:
+                print()
+                print(index.read(hit))
+                print()
+    print(f"{len(hits)} of {index.doc_count} docs in {elapsed * 1000:.1f}ms")
+
+
+if __name__ == "__main__":
+    main()
@@ -0,0 +1,146 @@
+"""
+Writes a docs build as a seekable zstd file, with the tree listing and every doc
+compressed as an independent frame, so that a reader only decompresses the docs it
+needs.
+
+    python docs_zstd.py docs-taskgraph.txt.zst
+    python docs_zstd.py docs-taskgraph.txt.zst reference/transforms.rst
+
+The frames are followed by the seek table of the zstd seekable format, which other
+readers of the format understand and plain zstd decoders skip, so the whole file still
+decompresses to the build. The path, URL and byte range of every frame are also written
+to a .json index next to the file.
+
+https://github.com/facebook/zstd/blob/dev/contrib/seekable_format/zstd_seekable_compression_format.md
+"""
+
+import argparse
+import json
+import struct
+import sys
+from pathlib import Path
+from typing import BinaryIO
+
+from docs_manifest import SEPARATOR, load_manifest
+
+# The format constants and helpers up to zstd_path() are a copy of the ones in
+# src/cost/seekable_zstd.py, with the same names. The scripts in gpt/ are copied into
+# other repos on their own, so they can't import from src/cost. Keep the two in sync.
+SKIPPABLE_MAGIC = 0x184D2A5E
+SEEKABLE_MAGIC = 0x8F92EAB1
+FOOTER = struct.Struct("<IBI")
+ENTRY = struct.Struct("<II")
+
+
+def zstandard_module():
+    try:
+        import zstandard
+    except ImportError:
+        raise SystemExit("Writing .zst files requires: pip install zstandard")
+    return zstandard
+
+
+def index_path(path: Path) -> Path:
+    return path.with_name(path.name + ".json")
+
+
+def write_seek_table(out: BinaryIO, sizes: list[tuple[int, int]]) -> None:
+    """
+    Writes the skippable frame with the (compressed size, decompressed size) of every
+    frame, which ends the file.
+    """
+    table = b"".join(ENTRY.pack(*size) for size in sizes)
+    table += FOOTER.pack(len(sizes), 0, SEEKABLE_MAGIC)
+    out.write(struct.pack("<II", SKIPPABLE_MAGIC, len(table)))
+    out.write(table)
+
+
+def zstd_path(output_file: Path) -> Path:
+    return output_file.with_name(output_file.name + ".zst")
+
+
+def write_zstd(output_file: Path, path: Path | None = None, level: int = 19) -> Path:
+    """
+    Compresses the tree listing, and then every doc with the separator before it, as
+    frames of their own, so that the frames decompress to the build when joined.
+    """
+    manifest = load_manifest(output_file)
+    if manifest is None:
+        raise SystemExit(f"{output_file} has no up to date manifest, run a build first")
+    path = path or zstd_path(output_file)
+    compressor = zstandard_module().ZstdCompressor(level=level)
+    frames = []
+    tmp_file = path.with_name(path.name + ".tmp")
+    with output_file.open("rb") as f, tmp_file.open("wb") as out:
+
+        def write_frame(path: str, url: str, data: bytes) -> None:
+            compressed = compressor.compress(data)
+            frames.append(
+                {
+                    "path": path,
+                    "url": url,
+                    "offset": out.tell(),
+                    "length": len(compressed),
+                    "size": len(data),
+                }
+            )
+            out.write(compressed)
+
+        write_frame(".", "", f.read(manifest.tree_length))
+        separator = SEPARATOR.encode("utf-8")
+        for section in manifest.sections:
+            # The separator after the tree listing, and between the docs.
+            f.seek(section.offset - len(separator))
+            write_frame(
+                section.path, section.url, f.read(section.length + len(separator))
+            )
+
+        write_seek_table(out, [(frame["length"], frame["size"]) for frame in frames])
+    tmp_file.replace(path)
+    index_path(path).write_text(
+        json.dumps(
+            {"format": "zstd-seekable", "source": output_file.name, "frames": frames},
+            indent=1,
+        ),
+        encoding="utf-8",
+    )
+    return path
+
+
+def read_docs(path: Path, doc_paths: list[str]) -> dict[str, str]:
+    """Decompresses only the frames of the given docs."""
+    frames = json.loads(index_path(path).read_text(encoding="utf-8"))["frames"]
+    by_path = {frame["path"]: frame for frame in frames}
+    decompressor = zstandard_module().ZstdDecompressor()
+    docs = {}
+    with path.open("rb") as f:
+        for doc_path in doc_paths:
+            frame = by_path[doc_path]
+            f.seek(frame["offset"])
+            data = decompressor.decompress(
+                f.read(frame["length"]), max_output_size=frame["size"]
+            )
+            docs[doc_path] = data.decode("utf-8").removeprefix(SEPARATOR)
+    return docs
+
+
+def main():
+    parser = argparse.ArgumentParser(
+        description=__doc__, formatter_class=argparse.RawDescriptionHelpFormatter
+    )
+    parser.add_argument("path", type=Path, help="A .zst file written by a docs build.")
+    parser.add_argument("docs", nargs="*", help="Print these docs, by their path.")
+    args = parser.parse_args()
+
+    if args.docs:
+        for text in read_docs(args.path, args.docs).values():
+            sys.stdout.write(text + SEPARATOR)
+        return
+    frames = json.loads(index_path(args.path).read_text(encoding="utf-8"))["frames"]
+    print(f"{'doc':<60}{'bytes':>10}{'zstd':>10}")
+    for frame in frames:
+        print(f"{frame['path']:<60}{frame['size']:>10}{frame['length']:>10}")
+
+
+if __name__ == "__main__":
+    main()
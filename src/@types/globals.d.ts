@@ -276,6 +276,26 @@ interface ArtifactText {
 
 declare type MachinePricing = Record<string, MachinePrice>
 
+declare interface CompactMachinePricing {
+    // Each distinct machine record, stored once.
+    machines: MachinePrice[],
+    // Pool name to an index in `machines`.
+    pools: Record<string, number>
+}
+
+declare interface SeekableZstdIndex {
+    format: "zstd-seekable",
+    // Every frame, compressed on its own, in the order of the file.
+    frames: Array<{
+        name: string,
+        // The byte range of the compressed frame.
+        offset: number,
+        length: number,
+        // The size once decompressed.
+        size: number
+    }>
+}
+
 declare interface MachinePrice {
     machine_type: string,
     vcpus: number,
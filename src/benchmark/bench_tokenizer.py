@@ -0,0 +1,171 @@
+"""
+Measures the SentencePiece tokenizer throughput, and appends the results to
+tokenizer_results.json, which index.html charts across runs.
+
+    python bench_tokenizer.py
+    python bench_tokenizer.py --threads 1 2 4 8 --book quijote.txt
+
+Every case is warmed up first, and then timed call by call to report tokens/sec,
+chars/sec and the p50/p95/p99 latency of a call.
+"""
+
+import os
+import sys
+import json
+import time
+import argparse
+import platform
+import datetime
+import sentencepiece as spm
+from pathlib import Path
+from tokenize_input import text as quijote
+
+results_path = Path("tokenizer_results.json")
+
+
+def percentile(sorted_values, p):
+    # Nearest-rank percentile.
+    index = max(0, min(len(sorted_values) - 1, round(p / 100 * len(sorted_values)) - 1))
+    return sorted_values[index]
+
+
+def input_sizes(book=None):
+    """
+    Inputs from a single sentence to a whole book. Without a book file, the passage is
+    repeated to a book-like size.
+    """
+    paragraphs = [p for p in quijote.split("\n\n") if p.strip()]
+    longest = max(paragraphs, key=len)
+    sentence = longest.split(". ")[0] + "."
+    book_text = book.read_text(encoding="utf-8") if book else quijote * 40
+    return {
+        "sentence": sentence,
+        "paragraph": longest,
+        "chapter": quijote,
+        "book": book_text,
+    }
+
+
+def time_calls(fn, warmup, repeat):
+    for _ in range(warmup):
+        fn()
+    latencies = []
+    for _ in range(repeat):
+        start = time.perf_counter()
+        fn()
+        latencies.append(time.perf_counter() - start)
+    return sorted(latencies)
+
+
+def measure(case, mode, threads, fn, chars, tokens, warmup, repeat):
+    latencies = time_calls(fn, warmup, repeat)
+    total = sum(latencies)
+    return {
+        "case": case,
+        "mode": mode,
+        "threads": threads,
+        "chars": chars,
+        "tokens": tokens,
+        "calls": repeat,
+        "tokens_per_sec": round(tokens * repeat / total),
+        "chars_per_sec": round(chars * repeat / total),
+        "p50_ms": round(percentile(latencies, 50) * 1000, 4),
+        "p95_ms": round(percentile(latencies, 95) * 1000, 4),
+        "p99_ms": round(percentile(latencies, 99) * 1000, 4),
+    }
+
+
+def run_benchmark(model_file, sizes, threads, warmup, repeat):
+    processor = spm.SentencePieceProcessor(model_file=str(model_file))
+    results = []
+    for case, case_text in sizes.items():
+        lines = [line for line in case_text.split("\n") if line.strip()]
+        chars = sum(len(line) for line in lines)
+        tokens = sum(len(ids) for ids in processor.encode(lines))
+        # More calls on the small inputs for stable percentiles, and fewer on the big
+        # ones so that a run stays in the order of minutes.
+        case_repeat = max(5, min(repeat * 20, repeat * 50_000 // max(chars, 1)))
+
+        results.append(
+            measure(
+                case,
+                "single",
+                1,
+                lambda: [processor.encode(line) for line in lines],
+                chars,
+                tokens,
+                warmup,
+                case_repeat,
+            )
+        )
+        for num_threads in threads:
+            results.append(
+                measure(
+                    case,
+                    "batched",
+                    num_threads,
+                    lambda: processor.encode(lines, num_threads=num_threads),
+                    chars,
+                    tokens,
+                    warmup,
+                    case_repeat,
+                )
+            )
+        print(f"Finished {case}", file=sys.stderr)
+    return results
+
+
+def append_results(path, run):
+    runs = json.loads(path.read_text())["runs"] if path.exists() else []
+    runs.append(run)
+    path.write_text(json.dumps({"runs": runs}, indent=2))
+
+
+def main():
+    parser = argparse.ArgumentParser(
+        description=__doc__, formatter_class=argparse.RawDescriptionHelpFormatter
+    )
+    parser.add_argument("--model", type=Path, default=Path("enes.spm"))
+    parser.add_argument("--book", type=Path, help="A text file to use as the book")
+    parser.add_argument(
+        "--threads",
+        type=int,
+        nargs="+",
+        default=sorted({1, 2, 4, os.cpu_count() or 1}),
+    )
+    parser.add_argument("--warmup", type=int, default=3)
+    parser.add_argument("--repeat", type=int, default=50)
+    parser.add_argument("--label", default="", help="A name for this run")
+    parser.add_argument("--output", type=Path, default=results_path)
+    args = parser.parse_args()
+
+    results = run_benchmark(
+        args.model, input_sizes(args.book), args.threads, args.warmup, args.repeat
+    )
+    run = {
+        "label": args.label,
+        "date": datetime.datetime.now(datetime.timezone.utc).isoformat(),
+        "model": args.model.name,
+        "sentencepiece": spm.__version__,
+        "python": platform.python_version(),
+        "machine": platform.machine(),
+        "cpu_count": os.cpu_count(),
+        "results": results,
+    }
+    append_results(args.output, run)
+
+    print(
+        f"{'case':<10}{'mode':<9}{'threads':>8}{'tokens/s':>12}{'chars/s':>12}"
+        f"{'p50 ms':>10}{'p95 ms':>10}{'p99 ms':>10}"
+    )
+    for r in results:
+        print(
+            f"{r['case']:<10}{r['mode']:<9}{r['threads']:>8}{r['tokens_per_sec']:>12}"
+            f"{r['chars_per_sec']:>12}{r['p50_ms']:>10}{r['p95_ms']:>10}"
+            f"{r['p99_ms']:>10}"
+        )
+    print(f"Appended the results to {args.output}")
+
+
+if __name__ == "__main__":
+    main()
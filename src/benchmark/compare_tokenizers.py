@@ -0,0 +1,164 @@
+"""
+Compares SentencePiece models on the same corpus, to see both the speed and the
+sequence length effects of a vocabulary before training with it.
+
+    python compare_tokenizers.py enes.spm other.spm
+    python compare_tokenizers.py enes.spm other.spm --corpus eval.txt.gz --output cmp.json
+
+Every model runs in its own process, at the same time. Each line of the corpus files is
+a document, and without files the lines of the passage in tokenize_input.py are used.
+"""
+
+import sys
+import json
+import time
+import argparse
+import platform
+import datetime
+import sentencepiece as spm
+from array import array
+from pathlib import Path
+from concurrent.futures import ProcessPoolExecutor
+from corpus import iter_batches
+from tokenize_input import text as quijote
+from bench_tokenizer import percentile
+
+percentiles = [50, 90, 95, 99]
+
+
+def iter_documents(corpus):
+    if not corpus:
+        yield [line for line in quijote.split("\n") if line.strip()]
+        return
+    for path in corpus:
+        yield from iter_batches(path)
+
+
+def length_histogram(sorted_lengths):
+    """
+    The number of documents in each power of two bucket, {"<=1": n, "<=2": n, ...}.
+    """
+    histogram = {}
+    bound = 1
+    for length in sorted_lengths:
+        while length > bound:
+            bound *= 2
+        key = f"<={bound}"
+        histogram[key] = histogram.get(key, 0) + 1
+    return histogram
+
+
+def measure_model(model_file, corpus):
+    processor = spm.SentencePieceProcessor(model_file=str(model_file))
+    lengths = array("I")
+    chars = 0
+    words = 0
+    seconds = 0.0
+    for documents in iter_documents(corpus):
+        start = time.perf_counter()
+        encoded = processor.encode(documents)
+        seconds += time.perf_counter() - start
+        lengths.extend(map(len, encoded))
+        chars += sum(map(len, documents))
+        words += sum(len(document.split()) for document in documents)
+
+    sorted_lengths = sorted(lengths)
+    tokens = sum(sorted_lengths)
+    documents = len(sorted_lengths)
+    return {
+        "model": str(model_file),
+        "vocab_size": processor.get_piece_size(),
+        "documents": documents,
+        "chars": chars,
+        "words": words,
+        "tokens": tokens,
+        "seconds": round(seconds, 4),
+        "tokens_per_sec": round(tokens / seconds) if seconds else 0,
+        "chars_per_sec": round(chars / seconds) if seconds else 0,
+        "tokens_per_char": round(tokens / chars, 4) if chars else 0,
+        "tokens_per_word": round(tokens / words, 4) if words else 0,
+        "lengths": {
+            "mean": round(tokens / documents, 2) if documents else 0,
+            **{
+                f"p{p}": percentile(sorted_lengths, p) if documents else 0
+                for p in percentiles
+            },
+            "max": sorted_lengths[-1] if documents else 0,
+            "histogram": length_histogram(sorted_lengths),
+        },
+    }
+
+
+def compare(models, corpus):
+    with ProcessPoolExecutor(max_workers=len(models)) as executor:
+        return list(executor.map(measure_model, models, [corpus] * len(models)))
+
+
+def print_table(results):
+    rows = [
+        ("vocab size", lambda r: r["vocab_size"]),
+        ("tokens", lambda r: r["tokens"]),
+        ("tokens/s", lambda r: r["tokens_per_sec"]),
+        ("chars/s", lambda r: r["chars_per_sec"]),
+        ("tokens/char", lambda r: r["tokens_per_char"]),
+        ("tokens/word", lambda r: r["tokens_per_word"]),
+        ("mean length", lambda r: r["lengths"]["mean"]),
+        *((f"p{p} length", lambda r, p=p: r["lengths"][f"p{p}"]) for p in percentiles),
+        ("max length", lambda r: r["lengths"]["max"]),
+    ]
+    names = [Path(r["model"]).name for r in results]
+    width = max(14, *(len(name) + 2 for name in names))
+    print(f"{'':<14}" + "".join(f"{name:>{width}}" for name in names))
+    for label, value in rows:
+        print(f"{label:<14}" + "".join(f"{value(r):>{width}}" for r in results))
+
+    buckets = sorted(
+        {bucket for r in results for bucket in r["lengths"]["histogram"]},
+        key=lambda bucket: int(bucket[2:]),
+    )
+    print("\nDocuments by length")
+    for bucket in buckets:
+        print(
+            f"{bucket:<14}"
+            + "".join(
+                f"{r['lengths']['histogram'].get(bucket, 0):>{width}}" for r in results
+            )
+        )
+
+
+def main():
+    parser = argparse.ArgumentParser(
+        description=__doc__, formatter_class=argparse.RawDescriptionHelpFormatter
+    )
+    parser.add_argument("models", nargs="+", type=Path)
+    parser.add_argument(
+        "--corpus",
+        nargs="+",
+        type=Path,
+        help="Plain, .gz or .zst text files with one document per line",
+    )
+    parser.add_argument("--output", type=Path, help="Write the comparison as JSON")
+    args = parser.parse_args()
+
+    start = time.perf_counter()
+    results = compare(args.models, args.corpus)
+    print(
+        f"Compared {len(results)} models in {time.perf_counter() - start:.2f}s",
+        file=sys.stderr,
+    )
+    print_table(results)
+
+    if args.output:
+        comparison = {
+            "date": datetime.datetime.now(datetime.timezone.utc).isoformat(),
+            "corpus": [str(path) for path in args.corpus or []],
+            "sentencepiece": spm.__version__,
+            "python": platform.python_version(),
+            "results": results,
+        }
+        args.output.write_text(json.dumps(comparison, indent=2))
+        print(f"Saved the comparison to {args.output}")
+
+
+if __name__ == "__main__":
+    main()
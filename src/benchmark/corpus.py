@@ -0,0 +1,210 @@
+"""
+Streams large corpora through SentencePiece in a process pool.
+
+Plain text files are memory-mapped and split into line-aligned byte ranges, so only the
+offsets are sent to the workers. Gzip and zstd files are decompressed as a stream and
+sent in line-aligned chunks. Each line is a document, and the per-document token counts
+come back in order, with a bounded number of chunks in flight.
+"""
+
+import io
+import os
+import gzip
+import mmap
+import time
+import collections
+from array import array
+from pathlib import Path
+from dataclasses import dataclass, field
+from concurrent.futures import ProcessPoolExecutor
+from token_ids import id_typecode
+from tokenizer_service import get_service, pool_context
+
+default_chunk_bytes = 16 * 1024 * 1024
+
+# The processor of each worker process, set once by `init_worker`.
+worker_processor = None
+
+
+def open_compressed(path):
+    if path.suffix == ".gz":
+        return gzip.open(path, "rb")
+    if path.suffix == ".zst":
+        try:
+            import zstandard
+        except ImportError:
+            raise SystemExit("Reading .zst files requires: pip install zstandard")
+        return io.BufferedReader(
+            zstandard.ZstdDecompressor().stream_reader(path.open("rb"))
+        )
+    return None
+
+
+def iter_chunks(path, chunk_bytes=default_chunk_bytes):
+    """
+    Yields ("range", path, start, end) for plain files, or ("data", bytes) for
+    compressed ones. Every chunk ends on a line boundary.
+    """
+    stream = open_compressed(path)
+    if stream is not None:
+        with stream:
+            while chunk := stream.read(chunk_bytes):
+                yield ("data", chunk + stream.readline())
+        return
+
+    size = path.stat().st_size
+    if size == 0:
+        return
+    with path.open("rb") as f, mmap.mmap(f.fileno(), 0, access=mmap.ACCESS_READ) as mm:
+        start = 0
+        while start < size:
+            end = min(start + chunk_bytes, size)
+            if end < size:
+                newline = mm.find(b"\n", end - 1)
+                end = size if newline == -1 else newline + 1
+            yield ("range", str(path), start, end)
+            start = end
+
+
+def init_worker(model_file):
+    """
+    Reuses the model when it was inherited from a preloaded parent.
+    """
+    global worker_processor
+    worker_processor = get_service(model_file).processor
+
+
+def read_chunk(task):
+    if task[0] == "data":
+        return task[1]
+    _, path, start, end = task
+    with open(path, "rb") as f, mmap.mmap(f.fileno(), 0, access=mmap.ACCESS_READ) as mm:
+        return mm[start:end]
+
+
+def chunk_lines(data):
+    lines = data.decode("utf-8", errors="replace").split("\n")
+    if lines and lines[-1] == "":
+        lines.pop()
+    return lines
+
+
+def iter_batches(path, batch_bytes=1024 * 1024):
+    """
+    Yields the lines of a file in batches, in this process.
+    """
+    stream = open_compressed(path) or path.open("rb")
+    with stream:
+        while chunk := stream.read(batch_bytes):
+            yield chunk_lines(chunk + stream.readline())
+
+
+def count_chunk(task):
+    """
+    Returns the token count of each line in the chunk, and the chunk's size in bytes.
+    """
+    data = read_chunk(task)
+    counts = array("I", map(len, worker_processor.encode(chunk_lines(data))))
+    return counts, len(data)
+
+
+def encode_chunk(task):
+    """
+    Like `count_chunk`, but also returns the ids of the chunk, as uint16 when the
+    vocabulary fits, or int32 otherwise.
+    """
+    data = read_chunk(task)
+    encoded = worker_processor.encode(chunk_lines(data))
+    ids = array(id_typecode(worker_processor.get_piece_size()))
+    for document in encoded:
+        ids.extend(document)
+    return array("I", map(len, encoded)), len(data), ids
+
+
+@dataclass
+class CorpusStats:
+    documents: int = 0
+    tokens: int = 0
+    bytes: int = 0
+    seconds: float = 0.0
+    model_load_seconds: float = None
+    by_file: dict = field(default_factory=dict)
+
+    def summary(self):
+        return {
+            "documents": self.documents,
+            "tokens": self.tokens,
+            "bytes": self.bytes,
+            "seconds": round(self.seconds, 3),
+            "tokens_per_sec": round(self.tokens / self.seconds) if self.seconds else 0,
+            "model_load_seconds": (
+                round(self.model_load_seconds, 4)
+                if self.model_load_seconds is not None
+                else None
+            ),
+            "by_file": self.by_file,
+        }
+
+
+def ordered_map(executor, fn, tasks, max_in_flight):
+    """
+    Like executor.map, but only keeps `max_in_flight` tasks queued, so that the input
+    is never read further ahead than that.
+    """
+    pending = collections.deque()
+    for task in tasks:
+        pending.append(executor.submit(fn, task))
+        if len(pending) >= max_in_flight:
+            yield pending.popleft().result()
+    while pending:
+        yield pending.popleft().result()
+
+
+def tokenize_corpus(
+    paths,
+    model_file,
+    workers=None,
+    chunk_bytes=default_chunk_bytes,
+    on_counts=None,
+    on_ids=None,
+    preload=True,
+):
+    """
+    Counts the tokens of every line of every file. `on_counts(path, counts)` receives
+    the per-document counts of each chunk, in order. When given, `on_ids(path, counts,
+    ids)` also receives the ids of each chunk, back to back. With `preload`, the model
+    is loaded here and shared with forked workers, instead of loaded by each one.
+    """
+    workers = workers or os.cpu_count() or 1
+    stats = CorpusStats()
+    start = time.perf_counter()
+    if preload:
+        service = get_service(model_file).preload()
+        stats.model_load_seconds = service.load_seconds
+    with ProcessPoolExecutor(
+        max_workers=workers,
+        mp_context=pool_context(preload),
+        initializer=init_worker,
+        initargs=(str(model_file),),
+    ) as executor:
+        for path in map(Path, paths):
+            file_stats = {"documents": 0, "tokens": 0, "bytes": 0}
+            for counts, size, *ids in ordered_map(
+                executor,
+                encode_chunk if on_ids else count_chunk,
+                iter_chunks(path, chunk_bytes),
+                workers * 2,
+            ):
+                file_stats["documents"] += len(counts)
+                file_stats["tokens"] += sum(counts)
+                file_stats["bytes"] += size
+                if on_counts:
+                    on_counts(path, counts)
+                if on_ids:
+                    on_ids(path, counts, ids[0])
+            stats.by_file[str(path)] = file_stats
+            stats.documents += file_stats["documents"]
+            stats.tokens += file_stats["tokens"]
+            stats.bytes += file_stats["bytes"]
+    stats.seconds = time.perf_counter() - start
+    return stats
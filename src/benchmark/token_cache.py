@@ -0,0 +1,179 @@
+"""
+A token count cache around a SentencePieceProcessor, so that re-counting the same
+evaluation sets only tokenizes the segments that are new or changed.
+
+Counts are keyed by a hash of the model file and a hash of the text. Recent counts are
+kept in a bounded in-memory LRU, and every count is persisted to SQLite.
+"""
+
+import time
+import sqlite3
+import hashlib
+import collections
+from pathlib import Path
+from dataclasses import dataclass
+from corpus import CorpusStats, iter_batches
+
+cache_path = Path(".token-count-cache.sqlite")
+
+schema = """
+CREATE TABLE IF NOT EXISTS token_counts (
+    model TEXT NOT NULL,
+    text_hash BLOB NOT NULL,
+    tokens INTEGER NOT NULL,
+    PRIMARY KEY (model, text_hash)
+) WITHOUT ROWID;
+"""
+
+
+def hash_model(model_file):
+    digest = hashlib.sha256()
+    with Path(model_file).open("rb") as f:
+        for block in iter(lambda: f.read(1 << 20), b""):
+            digest.update(block)
+    return digest.hexdigest()
+
+
+def hash_text(text):
+    return hashlib.blake2b(text.encode("utf-8"), digest_size=16).digest()
+
+
+@dataclass
+class CacheStats:
+    memory_hits: int = 0
+    disk_hits: int = 0
+    misses: int = 0
+
+    @property
+    def lookups(self):
+        return self.memory_hits + self.disk_hits + self.misses
+
+    def summary(self):
+        hit_rate = (
+            (self.memory_hits + self.disk_hits) / self.lookups if self.lookups else 0
+        )
+        return {
+            "lookups": self.lookups,
+            "memory_hits": self.memory_hits,
+            "disk_hits": self.disk_hits,
+            "misses": self.misses,
+            "hit_rate": round(hit_rate, 4),
+        }
+
+
+class TokenCountCache:
+    def __init__(self, processor, model_file, path=cache_path, max_entries=100_000):
+        self.processor = processor
+        self.model = hash_model(model_file)
+        self.max_entries = max_entries
+        self.memory = collections.OrderedDict()
+        self.stats = CacheStats()
+        self.db = sqlite3.connect(path)
+        self.db.executescript(schema)
+
+    def close(self):
+        self.db.close()
+
+    def __enter__(self):
+        return self
+
+    def __exit__(self, *exc):
+        self.close()
+
+    def remember(self, key, tokens):
+        self.memory[key] = tokens
+        self.memory.move_to_end(key)
+        if len(self.memory) > self.max_entries:
+            self.memory.popitem(last=False)
+
+    def count(self, text):
+        return self.count_many([text])[0]
+
+    def count_many(self, texts):
+        """
+        Counts a batch of segments. The disk lookups and the tokenization of the misses
+        are each done in one batch.
+        """
+        keys = [hash_text(text) for text in texts]
+        counts = [None] * len(texts)
+
+        missing = []
+        for i, key in enumerate(keys):
+            tokens = self.memory.get(key)
+            if tokens is None:
+                missing.append(i)
+            else:
+                self.memory.move_to_end(key)
+                self.stats.memory_hits += 1
+                counts[i] = tokens
+
+        on_disk = self.load([keys[i] for i in missing])
+        # Repeats of a segment within the batch are encoded once, and count as hits.
+        to_encode = {}
+        for i in missing:
+            tokens = on_disk.get(keys[i])
+            if tokens is not None:
+                self.stats.disk_hits += 1
+                counts[i] = tokens
+                self.remember(keys[i], tokens)
+            elif keys[i] in to_encode:
+                self.stats.memory_hits += 1
+                to_encode[keys[i]].append(i)
+            else:
+                to_encode[keys[i]] = [i]
+
+        if to_encode:
+            self.stats.misses += len(to_encode)
+            encoded = self.processor.encode(
+                [texts[indexes[0]] for indexes in to_encode.values()]
+            )
+            rows = []
+            for (key, indexes), ids in zip(to_encode.items(), encoded):
+                for i in indexes:
+                    counts[i] = len(ids)
+                self.remember(key, len(ids))
+                rows.append((self.model, key, len(ids)))
+            with self.db:
+                self.db.executemany(
+                    "INSERT OR REPLACE INTO token_counts VALUES (?, ?, ?)", rows
+                )
+        return counts
+
+    def load(self, keys, batch_size=500):
+        found = {}
+        unique_keys = list(set(keys))
+        for start in range(0, len(unique_keys), batch_size):
+            batch = unique_keys[start : start + batch_size]
+            placeholders = ",".join("?" * len(batch))
+            found.update(
+                self.db.execute(
+                    "SELECT text_hash, tokens FROM token_counts "
+                    f"WHERE model = ? AND text_hash IN ({placeholders})",
+                    [self.model, *batch],
+                )
+            )
+        return found
+
+
+def count_files(paths, cache, on_counts=None):
+    """
+    The single process counterpart of `corpus.tokenize_corpus`, which only tokenizes
+    the lines that are not in the cache yet.
+    """
+    stats = CorpusStats()
+    start = time.perf_counter()
+    for path in map(Path, paths):
+        file_stats = {"documents": 0, "tokens": 0, "bytes": 0}
+        for lines in iter_batches(path):
+            counts = cache.count_many(lines)
+            file_stats["documents"] += len(counts)
+            file_stats["tokens"] += sum(counts)
+            file_stats["bytes"] += sum(len(line.encode("utf-8")) + 1 for line in lines)
+            if on_counts:
+                on_counts(path, counts)
+        stats.by_file[str(path)] = file_stats
+        stats.documents += file_stats["documents"]
+        stats.tokens += file_stats["tokens"]
+        stats.bytes += file_stats["bytes"]
+    stats.seconds = time.perf_counter() - start
+    return stats
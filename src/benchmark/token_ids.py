@@ -0,0 +1,117 @@
+"""
+Writes the token ids of a corpus to a flat binary file, with an offsets index, so that
+they can be memory-mapped with NumPy later instead of tokenizing again.
+
+For an output path of corpus.ids, three files are written:
+
+    corpus.ids          The ids of every document, back to back, as little-endian
+                        uint16 when the vocabulary fits, or int32 otherwise.
+    corpus.ids.offsets  Little-endian int64, the start of each document in corpus.ids
+                        followed by the total, so document i is ids[offsets[i]:offsets[i + 1]].
+    corpus.ids.json     The dtype, the model, the counts and the documents of each file.
+
+Read them back with `load_token_ids`.
+"""
+
+import sys
+import json
+from array import array
+from pathlib import Path
+
+# The array typecodes, and the matching NumPy dtypes of the files.
+uint16_typecode = "H"
+int32_typecode = "i"
+dtypes = {uint16_typecode: "<u2", int32_typecode: "<i4"}
+
+
+def id_typecode(vocab_size):
+    return uint16_typecode if vocab_size <= 1 << 16 else int32_typecode
+
+
+def offsets_path(path):
+    return path.with_name(path.name + ".offsets")
+
+
+def meta_path(path):
+    return path.with_name(path.name + ".json")
+
+
+class TokenIdWriter:
+    """
+    Receives the ids of each chunk in order, through `write(path, counts, ids)`, which
+    has the signature of the `on_ids` callback of `corpus.tokenize_corpus`.
+    """
+
+    def __init__(self, path, model_file, vocab_size):
+        self.path = Path(path)
+        self.model_file = Path(model_file)
+        self.vocab_size = vocab_size
+        self.typecode = id_typecode(vocab_size)
+        self.files = {}
+        self.tokens = 0
+        self.documents = 0
+        self.ids_file = self.path.open("wb")
+        self.offsets_file = offsets_path(self.path).open("wb")
+        self.write_offsets([0])
+
+    def __enter__(self):
+        return self
+
+    def __exit__(self, *exc):
+        self.close()
+
+    def write_offsets(self, offsets):
+        offsets = array("q", offsets)
+        if sys.byteorder == "big":
+            offsets.byteswap()
+        offsets.tofile(self.offsets_file)
+
+    def write(self, path, counts, ids):
+        if not isinstance(ids, array) or ids.typecode != self.typecode:
+            ids = array(self.typecode, ids)
+        if sys.byteorder == "big":
+            ids.byteswap()
+        ids.tofile(self.ids_file)
+
+        offsets = []
+        for count in counts:
+            self.tokens += count
+            offsets.append(self.tokens)
+        self.write_offsets(offsets)
+
+        start, end = self.files.get(str(path), (self.documents, self.documents))
+        self.documents += len(counts)
+        self.files[str(path)] = (start, end + len(counts))
+
+    def close(self):
+        self.ids_file.close()
+        self.offsets_file.close()
+        meta = {
+            "dtype": dtypes[self.typecode],
+            "model": self.model_file.name,
+            "vocab_size": self.vocab_size,
+            "documents": self.documents,
+            "tokens": self.tokens,
+            "files": [
+                {"path": path, "documents": list(documents)}
+                for path, documents in self.files.items()
+            ],
+        }
+        meta_path(self.path).write_text(json.dumps(meta, indent=2))
+
+
+def load_token_ids(path):
+    """
+    Returns (ids, offsets, meta), with ids and offsets as read-only NumPy memmaps.
+    """
+    import numpy as np
+
+    path = Path(path)
+    meta = json.loads(meta_path(path).read_text())
+    if meta["tokens"]:
+        ids = np.memmap(path, dtype=meta["dtype"], mode="r")
+    else:
+        # An empty file can't be memory-mapped.
+        ids = np.zeros(0, dtype=meta["dtype"])
+    offsets = np.memmap(offsets_path(path), dtype="<i8", mode="r")
+    return ids, offsets, meta
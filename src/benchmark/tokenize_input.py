@@ -1,8 +1,15 @@
-import sentencepiece as spm
-
-s = spm.SentencePieceProcessor(model_file="enes.spm")
-tokens = s.encode(
-    """TASA
+import sys
+import json
+import argparse
+import contextlib
+from pathlib import Path
+from corpus import tokenize_corpus
+from token_ids import TokenIdWriter
+from tokenizer_service import get_service, worker_piece_size
+from token_cache import TokenCountCache, cache_path, count_files
+
+# The opening of Don Quijote, which is also the text of index.html.
+text = """TASA
 
 Yo, Juan Gallo de Andrada, escribano de Cámara del Rey nuestro señor, de los que residen en su Consejo, certifico y doy fe que, habiendo visto por los señores dél un libro intitulado El ingenioso hidalgo de la Mancha, compuesto por Miguel de Cervantes Saavedra, tasaron cada pliego del dicho libro a tres maravedís y medio; el cual tiene ochenta y tres pliegos, que al dicho precio monta el dicho libro docientos y noventa maravedís y medio, en que se ha de vender en papel; y dieron licencia para que a este precio se pueda vender, y mandaron que esta tasa se ponga al principio del dicho libro, y no se pueda vender sin ella. Y, para que dello conste, di la presente en Valladolid, a veinte días del mes de deciembre de mil y seiscientos y cuatro años.
 
@@ -357,6 +364,108 @@ Capítulo II. Que trata de la primera salida que de su tierra hizo el ingenioso
 Hechas, pues, estas prevenciones, no quiso aguardar más tiempo a poner en efeto su pensamiento, apretándole a ello la falta que él pensaba que hacía en el mundo su tardanza, según eran los agravios que pensaba deshacer, tuertos que enderezar, sinrazones que emendar, y abusos que mejorar y deudas que satisfacer. Y así, sin dar parte a persona alguna de su intención, y sin que nadie le viese, una mañana, antes del día, que era uno de los calurosos del mes de julio, se armó de todas sus armas, subió sobre Rocinante, puesta su mal compuesta celada, embrazó su adarga, tomó su lanza, y, por la puerta falsa de un corral, salió al campo con grandísimo contento y alborozo de ver con cuánta facilidad había dado principio a su buen deseo. Mas, apenas se vio en el campo, cuando le asaltó un pensamiento terrible, y tal, que por poco le hiciera dejar la comenzada empresa; y fue que le vino a la memoria que no era armado caballero, y que, conforme a ley de caballería, ni podía ni debía tomar armas con ningún caballero; y, puesto que lo fuera, había de llevar armas blancas, como novel caballero, sin empresa en el escudo, hasta que por su esfuerzo la ganase. Estos pensamientos le hicieron titubear en su propósito; mas, pudiendo más su locura que otra razón alguna, propuso de hacerse armar caballero del primero que topase, a imitación de otros muchos que así lo hicieron, según él había leído en los libros que tal le tenían. En lo de las armas blancas, pensaba limpiarlas de manera, en teniendo lugar, que lo fuesen más que un armiño; y con esto se quietó y prosiguió su camino, sin llevar otro que aquel que su caballo quería, creyendo que en aquello consistía la fuerza de las aventuras.
 
 Yendo, pues, caminando nuestro flamante aventurero, iba hablando consigo mesmo y diciendo:"""
-)
 
-print(len(tokens))
+
+def main():
+    parser = argparse.ArgumentParser(
+        description="Counts the tokens of the passage below, or of corpus files."
+    )
+    parser.add_argument(
+        "files",
+        nargs="*",
+        type=Path,
+        help="Plain, .gz or .zst text files with one document per line",
+    )
+    parser.add_argument("--model", type=Path, default=Path("enes.spm"))
+    parser.add_argument("--workers", type=int, help="Defaults to the CPU count")
+    parser.add_argument("--chunk-mb", type=float, default=16)
+    parser.add_argument(
+        "--counts", type=Path, help="Write the token count of each document here"
+    )
+    parser.add_argument(
+        "--cache",
+        type=Path,
+        nargs="?",
+        const=cache_path,
+        help="Reuse the token counts stored in this SQLite file, and store new ones. "
+        f"The files are then counted in a single process. Defaults to {cache_path}",
+    )
+    parser.add_argument("--cache-entries", type=int, default=100_000)
+    parser.add_argument(
+        "--ids",
+        type=Path,
+        help="Write the token ids to this file, with an offsets index, see token_ids.py",
+    )
+    parser.add_argument(
+        "--no-preload",
+        action="store_true",
+        help="Load the model in every worker, instead of once before forking them",
+    )
+    args = parser.parse_args()
+    if args.ids and args.cache:
+        parser.error("--ids can't be used with --cache, which only keeps the counts")
+
+    # Loaded on first use, so that a corpus run loads it once before forking workers.
+    service = get_service(args.model)
+    cache = None
+    if args.cache:
+        cache = TokenCountCache(
+            service.processor, args.model, args.cache, args.cache_entries
+        )
+
+    if not args.files:
+        if cache:
+            print(cache.count(text))
+        else:
+            tokens = service.encode(text)
+            print(len(tokens))
+            if args.ids:
+                with TokenIdWriter(
+                    args.ids, args.model, service.piece_size()
+                ) as writer:
+                    writer.write("passage", [len(tokens)], tokens)
+    else:
+        with contextlib.ExitStack() as stack:
+            on_counts = None
+            if args.counts:
+                counts_file = stack.enter_context(args.counts.open("w"))
+
+                def on_counts(path, counts):
+                    counts_file.write("\n".join(map(str, counts)) + "\n")
+
+            on_ids = None
+            if args.ids:
+                # With --no-preload, only the workers load the model.
+                vocab_size = (
+                    worker_piece_size(args.model)
+                    if args.no_preload
+                    else service.piece_size()
+                )
+                writer = stack.enter_context(
+                    TokenIdWriter(args.ids, args.model, vocab_size)
+                )
+                on_ids = writer.write
+
+            if cache:
+                stats = count_files(args.files, cache, on_counts)
+            else:
+                stats = tokenize_corpus(
+                    args.files,
+                    args.model,
+                    workers=args.workers,
+                    chunk_bytes=int(args.chunk_mb * 1024 * 1024),
+                    on_counts=on_counts,
+                    on_ids=on_ids,
+                    preload=not args.no_preload,
+                )
+        print(json.dumps(stats.summary(), indent=2))
+
+    if cache:
+        print(
+            f"Token count cache: {json.dumps(cache.stats.summary())}", file=sys.stderr
+        )
+        cache.close()
+
+
+if __name__ == "__main__":
+    main()
@@ -0,0 +1,207 @@
+"""
+Loads SentencePiece models lazily, once per process, and measures what that costs.
+
+    python tokenizer_service.py
+    python tokenizer_service.py --workers 1 2 4 8 --start-method spawn
+
+A model that is loaded before a worker pool forks is shared with the workers
+copy-on-write, instead of every worker loading its own copy. The command above reports
+the cold start time, and the load time and memory of every worker, with and without
+loading the model in the parent first, to help size the worker count.
+"""
+
+import os
+import sys
+import time
+import argparse
+import resource
+import statistics
+import multiprocessing
+import sentencepiece as spm
+from pathlib import Path
+from concurrent.futures import ProcessPoolExecutor
+
+
+class TokenizerService:
+    def __init__(self, model_file):
+        self.model_file = Path(model_file)
+        self.load_seconds = None
+        self._processor = None
+
+    @property
+    def loaded(self):
+        return self._processor is not None
+
+    @property
+    def processor(self):
+        if self._processor is None:
+            start = time.perf_counter()
+            self._processor = spm.SentencePieceProcessor(
+                model_file=str(self.model_file)
+            )
+            self.load_seconds = time.perf_counter() - start
+        return self._processor
+
+    def preload(self):
+        self.processor
+        return self
+
+    def encode(self, text, **kwargs):
+        return self.processor.encode(text, **kwargs)
+
+    def piece_size(self):
+        return self.processor.get_piece_size()
+
+
+# The services of this process. Forked workers inherit them, models and all.
+services = {}
+
+
+def get_service(model_file):
+    key = str(Path(model_file).resolve())
+    if key not in services:
+        services[key] = TokenizerService(model_file)
+    return services[key]
+
+
+def service_piece_size(model_file):
+    return get_service(model_file).piece_size()
+
+
+def worker_piece_size(model_file):
+    """
+    The vocabulary size, read by a worker process, so that this process doesn't load
+    the model, e.g. when the workers are meant to load their own.
+    """
+    with ProcessPoolExecutor(max_workers=1) as executor:
+        return executor.submit(service_piece_size, str(model_file)).result()
+
+
+def pool_context(preloaded):
+    """
+    Fork when the parent has a model to share and the platform allows it.
+    """
+    if preloaded and "fork" in multiprocessing.get_all_start_methods():
+        return multiprocessing.get_context("fork")
+    return multiprocessing.get_context()
+
+
+def memory_mb():
+    """
+    The resident memory of this process, split into pages that are shared with other
+    processes and pages that are private to it, on Linux. Elsewhere only the peak
+    resident memory is known.
+    """
+    try:
+        with open("/proc/self/smaps_rollup") as f:
+            fields = dict(line.split(":", 1) for line in f if ":" in line)
+    except OSError:
+        peak = resource.getrusage(resource.RUSAGE_SELF).ru_maxrss
+        peak_mb = peak / 1024 / 1024 if sys.platform == "darwin" else peak / 1024
+        return {"rss": round(peak_mb, 1)}
+
+    def mb(*names):
+        return round(sum(int(fields[name].split()[0]) for name in names) / 1024, 1)
+
+    return {
+        "rss": mb("Rss"),
+        "shared": mb("Shared_Clean", "Shared_Dirty"),
+        "private": mb("Private_Clean", "Private_Dirty"),
+    }
+
+
+# The barrier that makes every worker of a measurement take exactly one task, and
+# whether the worker inherited a loaded model.
+worker_barrier = None
+worker_preloaded = False
+
+
+def init_measured_worker(model_file, barrier):
+    global worker_barrier, worker_preloaded
+    worker_barrier = barrier
+    service = get_service(model_file)
+    worker_preloaded = service.loaded
+    service.encode("Calentando el tokenizador.")
+
+
+def measure_worker(model_file):
+    worker_barrier.wait(timeout=120)
+    service = get_service(model_file)
+    return {
+        "pid": os.getpid(),
+        "preloaded": worker_preloaded,
+        "load_seconds": 0.0 if worker_preloaded else service.load_seconds,
+        **memory_mb(),
+    }
+
+
+def measure_pool(model_file, workers, preload, start_method=None):
+    """
+    Starts a pool, and returns the time until every worker could encode, and the load
+    time and memory of each worker.
+    """
+    start = time.perf_counter()
+    if preload:
+        get_service(model_file).preload()
+    if start_method:
+        context = multiprocessing.get_context(start_method)
+    else:
+        context = pool_context(preload)
+    barrier = context.Barrier(workers)
+    with ProcessPoolExecutor(
+        max_workers=workers,
+        mp_context=context,
+        initializer=init_measured_worker,
+        initargs=(str(model_file), barrier),
+    ) as executor:
+        reports = list(executor.map(measure_worker, [str(model_file)] * workers))
+    return {
+        "workers": workers,
+        "preload": preload,
+        "start_method": context.get_start_method(),
+        "ready_seconds": round(time.perf_counter() - start, 4),
+        "worker_load_seconds": round(
+            statistics.mean(r["load_seconds"] for r in reports), 4
+        ),
+        "worker_memory_mb": {
+            key: round(statistics.mean(r[key] for r in reports), 1)
+            for key in reports[0]
+            if key in ("rss", "shared", "private")
+        },
+    }
+
+
+def main():
+    parser = argparse.ArgumentParser(
+        description=__doc__, formatter_class=argparse.RawDescriptionHelpFormatter
+    )
+    parser.add_argument("--model", type=Path, default=Path("enes.spm"))
+    parser.add_argument(
+        "--workers", type=int, nargs="+", default=sorted({1, 2, os.cpu_count() or 1})
+    )
+    parser.add_argument(
+        "--start-method", choices=multiprocessing.get_all_start_methods()
+    )
+    args = parser.parse_args()
+
+    cold = TokenizerService(args.model).preload()
+    print(f"Cold start: {cold.load_seconds * 1000:.1f} ms to load {args.model}")
+    print(
+        f"{'workers':>8}{'preload':>9}{'method':>12}{'ready s':>10}{'load ms':>10}"
+        f"{'rss MB':>9}{'shared MB':>11}{'private MB':>12}"
+    )
+    # Without preloading first, since a preloaded model stays in this process.
+    for preload in (False, True):
+        for workers in args.workers:
+            r = measure_pool(args.model, workers, preload, args.start_method)
+            memory = r["worker_memory_mb"]
+            print(
+                f"{r['workers']:>8}{str(r['preload']):>9}{r['start_method']:>12}"
+                f"{r['ready_seconds']:>10}{r['worker_load_seconds'] * 1000:>10.1f}"
+                f"{memory['rss']:>9}{memory.get('shared', '-'):>11}"
+                f"{memory.get('private', '-'):>12}"
+            )
+
+
+if __name__ == "__main__":
+    main()
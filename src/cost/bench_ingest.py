@@ -0,0 +1,132 @@
+"""
+Compare the worker-pools.yml ingestion paths on a synthetic file.
+
+    python bench_ingest.py --entries 100000
+
+Each path runs in its own process so that the peak RSS numbers don't bleed into
+each other.
+"""
+
+import sys
+import json
+import time
+import random
+import argparse
+import resource
+import tempfile
+import subprocess
+from pathlib import Path
+
+MODES = ["safe_load", "csafe_load", "stream"]
+
+
+def generate_worker_pools(path, entries, variants_per_pool=4, seed=0):
+    """
+    Writes a worker-pools.yml shaped file with `entries` pools * variants.
+    """
+    rng = random.Random(seed)
+    machine_types = ["n2-standard-8", "c2-standard-16", "n1-custom-8-32768"]
+    pool_count = max(1, entries // variants_per_pool)
+    with path.open("w") as f:
+        f.write("pools:\n")
+        for i in range(pool_count):
+            f.write(f"  - pool_id: 'translations-{{level}}/b-linux-{i}{{suffix}}'\n")
+            f.write(f"    description: Synthetic pool {i}\n")
+            f.write("    owner: nobody@mozilla.com\n")
+            f.write("    variants:\n")
+            for level in range(variants_per_pool):
+                f.write(f"      - level: {level}\n")
+                f.write(f"        suffix: '-{rng.choice(['a', 'b', 'c'])}'\n")
+            f.write("    config:\n")
+            f.write("      instance_types:\n")
+            f.write(f"        - machine_type: {rng.choice(machine_types)}\n")
+            f.write("          disks:\n")
+            f.write("            - type: PERSISTENT\n")
+            f.write(f"              diskSizeGb: {rng.randrange(50, 500)}\n")
+
+
+def count_pools(pools):
+    pool_count = 0
+    variant_count = 0
+    for pool in pools:
+        pool_count += 1
+        variant_count += len(pool.get("variants", [None]))
+    return pool_count, variant_count
+
+
+def run_mode(mode, path):
+    # Importing here keeps the import cost out of the parent process.
+    import yaml
+    from extract_machines import iter_pools
+
+    start_rss = resource.getrusage(resource.RUSAGE_SELF).ru_maxrss
+    start = time.perf_counter()
+
+    if mode == "safe_load":
+        pool_count, variant_count = count_pools(
+            yaml.safe_load(path.read_text())["pools"]
+        )
+    elif mode == "csafe_load":
+        with path.open("rb") as f:
+            pools = yaml.load(f, Loader=yaml.CSafeLoader)["pools"]
+        pool_count, variant_count = count_pools(pools)
+    else:
+        # The pools are read while they are counted, so the file stays open.
+        with path.open("rb") as f:
+            pool_count, variant_count = count_pools(iter_pools(f))
+
+    return {
+        "mode": mode,
+        "seconds": round(time.perf_counter() - start, 3),
+        "start_rss_mb": round(start_rss / 1024, 1),
+        "peak_rss_mb": round(
+            resource.getrusage(resource.RUSAGE_SELF).ru_maxrss / 1024, 1
+        ),
+        "pools": pool_count,
+        "variants": variant_count,
+    }
+
+
+def main():
+    parser = argparse.ArgumentParser(description=__doc__)
+    parser.add_argument("--entries", type=int, default=100_000)
+    parser.add_argument("--modes", nargs="+", choices=MODES, default=MODES)
+    parser.add_argument("--run", choices=MODES, help=argparse.SUPPRESS)
+    parser.add_argument("--file", type=Path, help="Use an existing YAML file")
+    args = parser.parse_args()
+
+    if args.run:
+        print(json.dumps(run_mode(args.run, args.file)))
+        return
+
+    with tempfile.TemporaryDirectory() as tmp:
+        path = args.file
+        if path is None:
+            path = Path(tmp) / "worker-pools.yml"
+            generate_worker_pools(path, args.entries)
+        size_mb = path.stat().st_size / 1024 / 1024
+        print(f"{path} is {size_mb:.1f} MB")
+
+        results = []
+        for mode in args.modes:
+            output = subprocess.run(
+                [sys.executable, __file__, "--run", mode, "--file", str(path)],
+                cwd=Path(__file__).parent,
+                check=True,
+                capture_output=True,
+                text=True,
+            ).stdout
+            results.append(json.loads(output))
+
+    print(
+        f"{'mode':<12}{'seconds':>10}{'peak RSS MB':>14}{'pools':>10}{'variants':>10}"
+    )
+    for r in results:
+        print(
+            f"{r['mode']:<12}{r['seconds']:>10}{r['peak_rss_mb']:>14}"
+            f"{r['pools']:>10}{r['variants']:>10}"
+        )
+
+
+if __name__ == "__main__":
+    main()
@@ -16,6 +16,8 @@ const server = 'https://firefox-ci-tc.services.mozilla.com';
 //   > 'd3' refers to a UMD global, but the current file is a module.
 //   > Consider adding an import instead.
 const d3 = window.d3;
+/** @type {import("../@types/fzstd.d.ts")} */
+const fzstd = /** @type {any} */ (window).fzstd;
 
 const elements = {
   info: getElement('info'),
@@ -50,12 +52,17 @@ document.addEventListener('DOMContentLoaded', () => {
 let taskGroupsPromise;
 
 /**
+ * @param {string[]} workerTypes
  * @returns {Promise<MachinePricing>}
  */
-async function fetchMachinePricing() {
-  const response = await fetch('machine_pricing.json');
-  /** @type {MachinePricing} */
-  const machinePricing = await response.json();
+async function fetchMachinePricing(workerTypes) {
+  const start = performance.now();
+  const machinePricing =
+    (await fetchSeekableMachinePricing(workerTypes)) ??
+    (await fetchCompactMachinePricing());
+  console.log(
+    `Loaded the machine pricing in ${Math.round(performance.now() - start)}ms`,
+  );
   for (const [key, value] of [...Object.entries(machinePricing)]) {
     // Workers are being replaced by -d2g variants, map back to the historical versions
     // too.
@@ -67,6 +74,89 @@ async function fetchMachinePricing() {
   return machinePricing;
 }
 
+/**
+ * The compact pricing stores each distinct machine once, with an index from the
+ * pool to its machine. Prefer the zstd compressed copy, as it's a fraction of the
+ * size.
+ *
+ * @returns {Promise<MachinePricing>}
+ */
+async function fetchCompactMachinePricing() {
+  /** @type {CompactMachinePricing} */
+  let compact;
+  const response = await fetch('machine_pricing.compact.json.zst');
+  if (response.ok) {
+    const buffer = new Uint8Array(await response.arrayBuffer());
+    compact = JSON.parse(new TextDecoder().decode(fzstd.decompress(buffer)));
+  } else {
+    compact = await (await fetch('machine_pricing.compact.json')).json();
+  }
+
+  /** @type {MachinePricing} */
+  const machinePricing = {};
+  for (const [pool, index] of Object.entries(compact.pools)) {
+    machinePricing[pool] = compact.machines[index];
+  }
+  return machinePricing;
+}
+
+/**
+ * The worker pools are grouped by their first two dash separated parts, e.g.
+ * "b-linux" for "b-linux-large-gcp-d2g", the same as in pricing_formats.py.
+ *
+ * @param {string} pool
+ */
+function getPoolGroup(pool) {
+  return pool.split('-').slice(0, 2).join('-');
+}
+
+/**
+ * The seekable pricing compresses the compact pricing of every pool group as its
+ * own zstd frame, so only the frames of the groups of the given worker types are
+ * fetched, with range requests, and decompressed. Returns null when the seekable
+ * pricing wasn't published.
+ *
+ * @param {string[]} workerTypes
+ * @returns {Promise<MachinePricing | null>}
+ */
+async function fetchSeekableMachinePricing(workerTypes) {
+  const url = 'machine_pricing.seekable.zst';
+  const indexResponse = await fetch(url + '.json');
+  if (!indexResponse.ok) {
+    return null;
+  }
+  /** @type {SeekableZstdIndex} */
+  const index = await indexResponse.json();
+  const groups = new Set(workerTypes.map(getPoolGroup));
+  const frames = index.frames.filter((frame) => groups.has(frame.name));
+
+  /** @type {MachinePricing} */
+  const machinePricing = {};
+  await Promise.all(
+    frames.map(async ({ offset, length }) => {
+      const response = await fetch(url, {
+        headers: { Range: `bytes=${offset}-${offset + length - 1}` },
+      });
+      if (!response.ok) {
+        throw new Error(`Could not fetch ${url}: ${response.status}`);
+      }
+      let buffer = new Uint8Array(await response.arrayBuffer());
+      if (response.status !== 206) {
+        // The server ignored the range, and sent the whole file.
+        buffer = buffer.subarray(offset, offset + length);
+      }
+      /** @type {CompactMachinePricing} */
+      const compact = JSON.parse(
+        new TextDecoder().decode(fzstd.decompress(buffer)),
+      );
+      for (const [pool, machineIndex] of Object.entries(compact.pools)) {
+        machinePricing[pool] = compact.machines[machineIndex];
+      }
+    }),
+  );
+  return machinePricing;
+}
+
 async function main() {
   setupHandlers();
   const taskGroupIds = getTaskGroupIds();
@@ -349,7 +439,14 @@ async function getVisibleTaskGroup() {
 
 async function computeCost() {
   const taskGroups = await getVisibleTaskGroup();
-  const machinePricing = await fetchMachinePricing();
+  /** @type {Set<string>} */
+  const workerTypes = new Set();
+  for (const { tasks } of taskGroups) {
+    for (const { task } of tasks) {
+      workerTypes.add(task.workerType);
+    }
+  }
+  const machinePricing = await fetchMachinePricing([...workerTypes]);
   const { allCosts, breakdownCosts } = getCosts(machinePricing, taskGroups);
   elements.costBreakdown.style.display = 'block';
 
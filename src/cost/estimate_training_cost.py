@@ -0,0 +1,166 @@
+"""
+Estimates the hours and dollars of training on a corpus with every pool of
+machine_pricing.json, ranked by the cost of a billion tokens.
+
+    python estimate_training_cost.py --tokens 2e9 stats.json --throughput throughput.json
+    python estimate_training_cost.py --tokens 1e9 5e9 2.5e10 --tokens-per-sec 1500 --epochs 3
+
+A corpus size is either a token count, or a JSON file with a "tokens" count, like the
+output of tokenize_input.py or the .json next to its --ids. The training throughput
+comes from a JSON file of measured or configured tokens/sec:
+
+    {"pools": {"b-linux-v100-gpu-4": 52000},
+     "gpu_types": {"nvidia-v100": 13000},
+     "machine_types": {"n2-standard-8": 900}}
+
+A pool uses its own entry first, then its GPU type times its GPU count, then its
+machine type, and then --tokens-per-sec. Pools without any are left out.
+"""
+
+import json
+import argparse
+import numpy as np
+from pathlib import Path
+from task_costs import load_pool_entries, pricing_path
+
+
+def parse_corpus(value):
+    """
+    Returns [(label, tokens)] for a token count or a JSON file of counts.
+    """
+    path = Path(value)
+    if not path.exists():
+        try:
+            return [(value, float(value))]
+        except ValueError:
+            raise argparse.ArgumentTypeError(
+                f"{value} is neither a token count nor an existing file"
+            )
+    stats = json.loads(path.read_text())
+    if "results" in stats:
+        # A compare_tokenizers.py report, one size per model.
+        return [
+            (f"{path.name}:{Path(r['model']).name}", r["tokens"])
+            for r in stats["results"]
+        ]
+    return [(path.name, stats["tokens"])]
+
+
+def pool_throughput(pool, entry, throughput, default):
+    if pool in throughput.get("pools", {}):
+        return throughput["pools"][pool]
+    gpu_type = entry.get("gpu_type")
+    if gpu_type in throughput.get("gpu_types", {}):
+        return throughput["gpu_types"][gpu_type] * entry.get("gpu_count", 1)
+    if entry.get("machine_type") in throughput.get("machine_types", {}):
+        return throughput["machine_types"][entry["machine_type"]]
+    return default
+
+
+def estimate(pool_entries, corpus_tokens, throughput, default=None, epochs=1.0):
+    """
+    Returns (pools, usd_per_billion, hours, usd) for the pools with a price and a
+    throughput, ranked by usd_per_billion. hours and usd are (pools, corpora) arrays.
+    """
+    pools = []
+    tokens_per_sec = []
+    usd_per_hour = []
+    for pool, entry in pool_entries.items():
+        tps = pool_throughput(pool, entry, throughput, default)
+        if tps and entry.get("usd_per_hour") is not None:
+            pools.append(pool)
+            tokens_per_sec.append(tps)
+            usd_per_hour.append(entry["usd_per_hour"])
+    tokens_per_sec = np.array(tokens_per_sec, dtype=np.float64)
+    usd_per_hour = np.array(usd_per_hour, dtype=np.float64)
+    corpus_tokens = np.asarray(corpus_tokens, dtype=np.float64)
+
+    hours = corpus_tokens[np.newaxis, :] * epochs / tokens_per_sec[:, np.newaxis] / 3600
+    usd = hours * usd_per_hour[:, np.newaxis]
+    usd_per_billion = usd_per_hour / (tokens_per_sec * 3600) * 1e9
+
+    order = np.argsort(usd_per_billion, kind="stable")
+    return (
+        [pools[i] for i in order],
+        usd_per_billion[order],
+        hours[order],
+        usd[order],
+    )
+
+
+def main():
+    parser = argparse.ArgumentParser(
+        description=__doc__, formatter_class=argparse.RawDescriptionHelpFormatter
+    )
+    parser.add_argument(
+        "--tokens",
+        nargs="+",
+        type=parse_corpus,
+        required=True,
+        help="Token counts, or JSON files with a tokens count",
+    )
+    parser.add_argument("--throughput", type=Path, help="Tokens/sec by pool or type")
+    parser.add_argument(
+        "--tokens-per-sec", type=float, help="The throughput of the other pools"
+    )
+    parser.add_argument("--epochs", type=float, default=1.0)
+    parser.add_argument("--pricing", type=Path, default=pricing_path)
+    parser.add_argument("--top", type=int, default=20, help="Pools to print")
+    parser.add_argument("--output", type=Path, help="Write every estimate as JSON")
+    args = parser.parse_args()
+    if not args.throughput and not args.tokens_per_sec:
+        parser.error("Either --throughput or --tokens-per-sec is required")
+
+    corpora = [corpus for corpora in args.tokens for corpus in corpora]
+    throughput = json.loads(args.throughput.read_text()) if args.throughput else {}
+    pool_entries = load_pool_entries(args.pricing)
+    pools, usd_per_billion, hours, usd = estimate(
+        pool_entries,
+        [tokens for _, tokens in corpora],
+        throughput,
+        args.tokens_per_sec,
+        args.epochs,
+    )
+
+    width = max([len("pool"), *map(len, pools[: args.top])]) + 2
+    header = f"{'pool':<{width}}{'$/B tokens':>12}"
+    for j, (label, tokens) in enumerate(corpora, 1):
+        print(f"#{j} {label}: {tokens:,.0f} tokens x {args.epochs:g} epochs")
+        header += f"{f'#{j} hours':>12}{f'#{j} USD':>12}"
+    print(header)
+    for i, pool in enumerate(pools[: args.top]):
+        line = f"{pool:<{width}}{usd_per_billion[i]:>12.2f}"
+        for j in range(len(corpora)):
+            line += f"{hours[i, j]:>12.1f}{usd[i, j]:>12.2f}"
+        print(line)
+    skipped = sorted(set(pool_entries) - set(pools))
+    if skipped:
+        print(f"No throughput or price for {len(skipped)} pools, see --output")
+
+    if args.output:
+        estimates = {
+            "epochs": args.epochs,
+            "corpora": [
+                {"label": label, "tokens": tokens} for label, tokens in corpora
+            ],
+            "pools": [
+                {
+                    "pool": pool,
+                    "machine_type": pool_entries[pool].get("machine_type"),
+                    "gpu_type": pool_entries[pool].get("gpu_type"),
+                    "gpu_count": pool_entries[pool].get("gpu_count", 0),
+                    "usd_per_hour": pool_entries[pool]["usd_per_hour"],
+                    "usd_per_billion_tokens": round(float(usd_per_billion[i]), 4),
+                    "hours": np.round(hours[i], 3).tolist(),
+                    "usd": np.round(usd[i], 2).tolist(),
+                }
+                for i, pool in enumerate(pools)
+            ],
+            "skipped_pools": skipped,
+        }
+        args.output.write_text(json.dumps(estimates, indent=2))
+        print(f"Saved the estimates to {args.output}")
+
+
+if __name__ == "__main__":
+    main()
@@ -3,29 +3,182 @@ Vibed code to build the pool_to_machine_type.json, including GPU cost informatio
 """
 
 import re
+import sys
 import yaml
 import json
+import hashlib
+import argparse
+import functools
+import itertools
 import requests
+import numpy as np
 from pathlib import Path
+from yaml.composer import Composer
+from yaml.constructor import SafeConstructor
+from yaml.resolver import Resolver
+from pricing import PricingIndex, cost_path, gpu_cost_path, custom_cost_path
+from pricing_formats import write_compact, write_seekable_pricing
+from seekable_zstd import zstandard_installed
+from pricing_diff import write_diff, is_empty
+from pricing_history import PricingHistory
+from profiling import StageProfiler
 
-# Load cost tables
-cost_path = Path("cpu_costs.json")
-gpu_cost_path = Path("gpu_costs.json")
-
-with cost_path.open() as f:
-    machine_costs = json.load(f)
-with gpu_cost_path.open() as f:
-    gpu_costs = json.load(f)
+output_path = Path("machine_pricing.json")
 
-# Download the YAML
 # https://github.com/mozilla-releng/fxci-config/blob/main/worker-pools.yml
 url = "https://raw.githubusercontent.com/mozilla-releng/fxci-config/refs/heads/main/worker-pools.yml"
-resp = requests.get(url)
-resp.raise_for_status()
 
-data = yaml.safe_load(resp.text)
+# The downloaded worker-pools.yml and its HTTP validators are kept here so that
+# re-runs can make conditional requests, or run fully offline.
+cache_dir = Path(".cache")
+
+
+def sha256_file(path):
+    digest = hashlib.sha256()
+    with path.open("rb") as f:
+        for block in iter(lambda: f.read(1 << 20), b""):
+            digest.update(block)
+    return digest.hexdigest()
+
+
+def load_cache_meta(cache_dir):
+    meta_path = cache_dir / "worker-pools.meta.json"
+    if not meta_path.exists():
+        return {}
+    return json.loads(meta_path.read_text())
+
+
+def save_cache_meta(cache_dir, meta):
+    meta_path = cache_dir / "worker-pools.meta.json"
+    meta_path.write_text(json.dumps(meta, indent=2))
+
+
+def fetch_worker_pools(url, cache_dir, offline=False, session=None, timeout=60):
+    """
+    Returns the path to a local copy of worker-pools.yml, only downloading it when
+    the server reports a change (ETag / Last-Modified).
+    """
+    cache_dir.mkdir(parents=True, exist_ok=True)
+    cached_path = cache_dir / "worker-pools.yml"
+    meta = load_cache_meta(cache_dir)
+
+    if offline:
+        if not cached_path.exists():
+            sys.exit(
+                f"--offline was given, but there is no cached copy at {cached_path}"
+            )
+        print(f"Using the cached {cached_path}")
+        return cached_path
+
+    headers = {}
+    if cached_path.exists() and meta.get("url") == url:
+        if meta.get("etag"):
+            headers["If-None-Match"] = meta["etag"]
+        if meta.get("last_modified"):
+            headers["If-Modified-Since"] = meta["last_modified"]
+
+    http = session or requests
+    with http.get(url, headers=headers, stream=True, timeout=timeout) as resp:
+        if resp.status_code == 304:
+            print(f"{url} is not modified, using the cached copy")
+            return cached_path
+        resp.raise_for_status()
+
+        digest = hashlib.sha256()
+        tmp_path = cached_path.with_suffix(".yml.tmp")
+        with tmp_path.open("wb") as f:
+            for block in resp.iter_content(chunk_size=1 << 16):
+                digest.update(block)
+                f.write(block)
+        tmp_path.replace(cached_path)
+
+        meta.update(
+            {
+                "url": url,
+                "etag": resp.headers.get("ETag"),
+                "last_modified": resp.headers.get("Last-Modified"),
+                "sha256": digest.hexdigest(),
+            }
+        )
+        save_cache_meta(cache_dir, meta)
+
+    print(f"Downloaded {url}")
+    return cached_path
+
+
+def inputs_digest(worker_pools_path):
+    """
+    A hash over everything that machine_pricing.json is derived from. The YAML is
+    hashed as it is on disk, as the cached copy can be edited by hand, the hash in the
+    cache meta only describes the download.
+    """
+    digest = hashlib.sha256(sha256_file(worker_pools_path).encode())
+    for path in (cost_path, gpu_cost_path, custom_cost_path):
+        digest.update(path.read_bytes())
+    return digest.hexdigest()
+
 
-pool_mappings = {}
+def output_paths(output, zstd=True):
+    """
+    Every file that a run writes next to the output, the dashboard reads them all.
+    The zstd copies are only written when zstandard is installed.
+    """
+    paths = [output, output.with_name(output.stem + ".compact.json")]
+    if zstd:
+        paths += [
+            output.with_name(output.stem + ".compact.json.zst"),
+            output.with_name(output.stem + ".seekable.zst"),
+            output.with_name(output.stem + ".seekable.zst.json"),
+        ]
+    return paths
+
+
+if yaml.__with_libyaml__:
+    from yaml.cyaml import CParser
+
+    class PoolLoader(CParser, Composer, SafeConstructor, Resolver):
+        """
+        Parses with libyaml, but composes nodes in Python so that the document can be
+        consumed one node at a time.
+        """
+
+        def __init__(self, stream):
+            CParser.__init__(self, stream)
+            Composer.__init__(self)
+            SafeConstructor.__init__(self)
+            Resolver.__init__(self)
+
+else:
+    PoolLoader = yaml.SafeLoader
+
+
+def iter_pools(stream):
+    """
+    Yields the entries of the top-level `pools` sequence one at a time, without
+    building the rest of the document in memory.
+    """
+    loader = PoolLoader(stream)
+    try:
+        loader.get_event()  # StreamStart
+        if loader.check_event(yaml.StreamEndEvent):
+            return
+        loader.get_event()  # DocumentStart
+        if not loader.check_event(yaml.MappingStartEvent):
+            raise ValueError("Expected worker-pools.yml to be a mapping")
+        loader.get_event()
+
+        while not loader.check_event(yaml.MappingEndEvent):
+            key = loader.construct_document(loader.compose_node(None, None))
+            if key != "pools" or not loader.check_event(yaml.SequenceStartEvent):
+                # Skip over the value, it may still define anchors used by pools.
+                loader.compose_node(None, None)
+                continue
+            loader.get_event()
+            while not loader.check_event(yaml.SequenceEndEvent):
+                yield loader.construct_document(loader.compose_node(None, None))
+            loader.get_event()
+    finally:
+        loader.dispose()
 
 
 def extract_instance_configs(instances):
@@ -39,24 +192,6 @@ def extract_instance_configs(instances):
     return []
 
 
-# Update pricing here:
-# https://cloud.google.com/compute/vm-instance-pricing?hl=en#custommachinetypepricing
-def price_custom_machine(machine_type):
-    match = re.fullmatch(r"n1-custom-(\d+)-(\d+)", machine_type)
-    if not match:
-        return None
-
-    vcpus = int(match.group(1))
-    mem_mib = int(match.group(2))
-    mem_gib = mem_mib / 1024
-
-    cpu_price = 0.03319155  # per vCPU per hour
-    mem_price = 0.004446  # per GiB RAM per hour
-
-    total = round(vcpus * cpu_price + mem_gib * mem_price, 6)
-    return {"vcpus": vcpus, "memory_gb": mem_gib, "usd_per_hour": total}
-
-
 def extract_gpu_info(instance_type):
     accels = instance_type.get("guestAccelerators", [])
     if not accels:
@@ -70,82 +205,279 @@ def extract_gpu_info(instance_type):
 
         # Normalize to match keys in gpu_costs
         norm_type = acc_type.lower().replace("nvidia-tesla-", "nvidia-")
-        gpu_price = gpu_costs.get(norm_type)
-
-        return {
-            "gpu_type": norm_type,
-            "gpu_count": acc_count,
-            "gpu_cost_per_hour": gpu_price,
-            "total_gpu_cost": gpu_price * acc_count if gpu_price is not None else None,
-        }
+        return {"gpu_type": norm_type, "gpu_count": acc_count}
 
     return None
 
 
-def add_pool(pool_key, machine_type, gpu_info=None):
-    entry = {"machine_type": machine_type}
-    cost_data = machine_costs.get(machine_type) or price_custom_machine(machine_type)
-    if cost_data:
-        entry.update(cost_data)
-
-    if gpu_info:
-        entry["gpu_type"] = gpu_info["gpu_type"]
-        entry["gpu_count"] = gpu_info["gpu_count"]
-        entry["gpu_cost_per_hour"] = gpu_info["gpu_cost_per_hour"]
-        entry["total_gpu_cost"] = gpu_info["total_gpu_cost"]
-        if (
-            entry.get("usd_per_hour") is not None
-            and gpu_info["total_gpu_cost"] is not None
-        ):
-            entry["usd_per_hour"] = round(
-                entry["usd_per_hour"] + gpu_info["total_gpu_cost"], 6
+def price_pools(index, pool_machines):
+    """
+    Prices every pool in one batch, and builds the machine_pricing.json entries.
+    """
+    pool_keys = list(pool_machines)
+    machine_types = [pool_machines[key][0] for key in pool_keys]
+    gpu_infos = [pool_machines[key][1] for key in pool_keys]
+    batch = index.batch(
+        machine_types,
+        [gpu_info and gpu_info["gpu_type"] for gpu_info in gpu_infos],
+        [gpu_info["gpu_count"] if gpu_info else 0 for gpu_info in gpu_infos],
+    )
+    machine_usd = index.machine_usd(batch)
+    gpu_usd = index.gpu_usd(batch)
+
+    pool_mappings = {}
+    for i, (pool_key, machine_type, gpu_info) in enumerate(
+        zip(pool_keys, machine_types, gpu_infos)
+    ):
+        entry = {"machine_type": machine_type}
+        if not np.isnan(machine_usd[i]):
+            vcpus, memory_gb, _, _ = index.parse_machine_type(machine_type)
+            entry["vcpus"] = vcpus
+            entry["memory_gb"] = memory_gb
+            entry["usd_per_hour"] = round(float(machine_usd[i]), 6)
+
+        if gpu_info:
+            total_gpu_cost = None if np.isnan(gpu_usd[i]) else float(gpu_usd[i])
+            entry["gpu_type"] = gpu_info["gpu_type"]
+            entry["gpu_count"] = gpu_info["gpu_count"]
+            entry["gpu_cost_per_hour"] = index.gpu_costs.get(gpu_info["gpu_type"])
+            entry["total_gpu_cost"] = total_gpu_cost
+            if entry.get("usd_per_hour") is not None and total_gpu_cost is not None:
+                entry["usd_per_hour"] = round(entry["usd_per_hour"] + total_gpu_cost, 6)
+            else:
+                entry["usd_per_hour"] = None
+
+        pool_mappings[pool_key] = entry
+    return pool_mappings
+
+
+placeholder_re = re.compile(r"\{([^{}]+)\}")
+
+
+@functools.lru_cache(maxsize=None)
+def compile_template(template):
+    """
+    Compiles a template like "{pool-group}/b-linux{suffix}" once into a positional
+    format string and the field names that feed it.
+    """
+    parts = placeholder_re.split(template)
+    literals = [part.replace("{", "{{").replace("}", "}}") for part in parts[0::2]]
+    fields = tuple(parts[1::2])
+    format_string = literals[0]
+    for index, literal in enumerate(literals[1:]):
+        format_string += f"{{{index}}}{literal}"
+    return format_string, fields
+
+
+def render_template(plan, context):
+    format_string, fields = plan
+    if not fields:
+        return format_string
+    # Unknown fields are left as-is, so that they are easy to spot in the output.
+    return format_string.format(
+        *(context.get(field, f"{{{field}}}") for field in fields)
+    )
+
+
+def expand_variants(pool):
+    """
+    Yields the attributes for every concrete pool. A variant value that is a list
+    expands into one pool per value, across the product of all of them.
+    """
+    attributes = pool.get("attributes") or {}
+    for variant in pool.get("variants") or [{}]:
+        keys = list(variant)
+        values = [
+            value if isinstance(value, list) else [value] for value in variant.values()
+        ]
+        for combination in itertools.product(*values):
+            yield {**attributes, **dict(zip(keys, combination))}
+
+
+def build_pool_mappings(pools):
+    """
+    Resolves every concrete pool to its (machine_type, gpu_info). When a pool has
+    several instance types, the last one wins.
+    """
+    pool_machines = {}
+    unresolved = set()
+    for pool in pools:
+        pool_id_plan = compile_template(pool["pool_id"])
+        instance_plans = [
+            (
+                compile_template(instance_type["machine_type"]),
+                extract_gpu_info(instance_type),
             )
-        else:
-            entry["usd_per_hour"] = None
+            for instance_type in extract_instance_configs(
+                pool.get("config", {}).get("instance_types", [])
+            )
+            if instance_type.get("machine_type")
+        ]
+
+        for context in expand_variants(pool):
+            pool_key = render_template(pool_id_plan, context).split("/")[-1]
+            for machine_type_plan, gpu_info in instance_plans:
+                machine_type = render_template(machine_type_plan, context)
+                if "{" in pool_key or "{" in machine_type:
+                    unresolved.add(pool_key)
+                pool_machines[pool_key] = (machine_type, gpu_info)
+
+    if unresolved:
+        print(
+            f"Warning: {len(unresolved)} pools have unresolved placeholders: "
+            + ", ".join(sorted(unresolved)),
+            file=sys.stderr,
+        )
+    return pool_machines
+
+
+def build_machine_pricing(worker_pools_path, index, profiler=None, pstats=False):
+    """
+    Parses, resolves and prices the pools. The "ingest" stage includes the time of the
+    "parse" stage, as the pools are resolved while they are being parsed.
+    """
+    profiler = profiler or StageProfiler()
+    with worker_pools_path.open("rb") as f:
+        with profiler.stage("ingest") as record, profiler.pstats(pstats):
+            pool_machines = build_pool_mappings(
+                profiler.timed_iter("parse", iter_pools(f))
+            )
+            record["items"] = len(pool_machines)
+    with profiler.stage("pricing", items=len(pool_machines)):
+        return price_pools(index, pool_machines)
+
+
+def write_outputs(pool_mappings, output=output_path):
+    """
+    Writes the mapping, and the compact, zstd and seekable copies of it that the
+    dashboard loads, so that none of them go stale.
+    """
+    output.write_text(json.dumps(pool_mappings, indent=2))
+    print(f"Saved mapping to {output}")
+
+    _, compact_path, _, seekable_path, _ = paths = output_paths(output)
+    zstd = zstandard_installed()
+    for path in write_compact(pool_mappings, compact_path, zstd):
+        print(f"Saved compact mapping to {path}")
 
-    pool_mappings[pool_key] = entry
+    if not zstd:
+        # The dashboard prefers the zstd copies, so stale ones are removed for it to
+        # fall back to the compact JSON.
+        for path in paths[2:]:
+            path.unlink(missing_ok=True)
+        print(
+            "zstandard isn't installed, so the zstd copies weren't written, and the "
+            "dashboard loads the compact JSON: pip install zstandard",
+            file=sys.stderr,
+        )
+        return
 
+    for path in write_seekable_pricing(pool_mappings, seekable_path):
+        print(f"Saved seekable mapping to {path}")
 
-for pool in data["pools"]:
-    pool_id_template = pool["pool_id"]
-    instance_configs = extract_instance_configs(
-        pool.get("config", {}).get("instance_types", [])
+
+def main():
+    parser = argparse.ArgumentParser(description=__doc__)
+    parser.add_argument("--url", default=url, help="Where to fetch worker-pools.yml")
+    parser.add_argument("--cache-dir", type=Path, default=cache_dir)
+    parser.add_argument(
+        "--offline",
+        action="store_true",
+        help="Don't touch the network, run from the cached worker-pools.yml",
+    )
+    parser.add_argument(
+        "--force",
+        action="store_true",
+        help="Rebuild the output even if none of the inputs changed",
+    )
+    parser.add_argument("--output", type=Path, default=output_path)
+    parser.add_argument(
+        "--diff",
+        action="store_true",
+        help="Write a patch against the previous output, and append to the change log",
+    )
+    parser.add_argument(
+        "--history",
+        type=Path,
+        help="Append the new mapping to this pricing_history.sqlite snapshot store",
+    )
+    parser.add_argument(
+        "--profile",
+        type=Path,
+        help="Write a JSON report of the time, peak memory and items of each stage",
     )
+    parser.add_argument(
+        "--pstats",
+        type=Path,
+        help="Dump a cProfile of the loop over the pools, for use with pstats",
+    )
+    args = parser.parse_args()
 
-    def resolve_id(variant_dict=None, attributes_dict=None):
-        resolved = pool_id_template
-        if variant_dict:
-            for key, value in variant_dict.items():
-                resolved = resolved.replace(f"{{{key}}}", str(value))
-        if attributes_dict:
-            for key, value in attributes_dict.items():
-                resolved = resolved.replace(f"{{{key}}}", str(value))
-        return resolved.split("/")[-1]
-
-    if "variants" in pool:
-        for variant in pool["variants"]:
-            pool_key = resolve_id(variant_dict=variant)
-            for instance_type in instance_configs:
-                machine_type = instance_type.get("machine_type")
-                if machine_type:
-                    gpu_info = extract_gpu_info(instance_type)
-                    add_pool(pool_key, machine_type, gpu_info)
-    elif "attributes" in pool and "suffix" in pool["attributes"]:
-        pool_key = resolve_id(attributes_dict=pool["attributes"])
-        for instance_type in instance_configs:
-            machine_type = instance_type.get("machine_type")
-            if machine_type:
-                gpu_info = extract_gpu_info(instance_type)
-                add_pool(pool_key, machine_type, gpu_info)
-    else:
-        pool_key = resolve_id()
-        for instance_type in instance_configs:
-            machine_type = instance_type.get("machine_type")
-            if machine_type:
-                gpu_info = extract_gpu_info(instance_type)
-                add_pool(pool_key, machine_type, gpu_info)
-
-# Save result
-output_path = Path("machine_pricing.json")
-output_path.write_text(json.dumps(pool_mappings, indent=2))
-print(f"Saved mapping to {output_path}")
+    profiler = StageProfiler(trace_memory=bool(args.profile))
+    try:
+        run(args, profiler)
+    finally:
+        if args.profile:
+            profiler.write(args.profile)
+            profiler.print_summary()
+            print(f"Saved the profile to {args.profile}")
+        if args.pstats and profiler.pstats_profile:
+            profiler.dump_pstats(args.pstats)
+            print(f"Saved the pool loop profile to {args.pstats}")
+
+
+def run(args, profiler):
+    with profiler.stage("download"):
+        worker_pools_path = fetch_worker_pools(args.url, args.cache_dir, args.offline)
+
+    with profiler.stage("hash"):
+        digest = inputs_digest(worker_pools_path)
+        meta = load_cache_meta(args.cache_dir)
+    if (
+        not args.force
+        and all(
+            path.exists() for path in output_paths(args.output, zstandard_installed())
+        )
+        and meta.get("inputs_digest") == digest
+        and meta.get("output") == str(args.output)
+    ):
+        print(f"No inputs changed, {args.output} is up to date")
+        return
+
+    pool_mappings = build_machine_pricing(
+        worker_pools_path,
+        PricingIndex.from_files(),
+        profiler,
+        pstats=bool(args.pstats),
+    )
+
+    if args.diff and args.output.exists():
+        patch_path = args.output.with_name(args.output.stem + ".patch.json")
+        changelog_path = args.output.with_name(args.output.stem + ".changelog.md")
+        previous = json.loads(args.output.read_text())
+        patch = write_diff(previous, pool_mappings, patch_path, changelog_path)
+        if is_empty(patch):
+            print("No pricing changes since the previous output")
+        else:
+            print(
+                f"Saved patch to {patch_path}: {len(patch['added'])} added, "
+                f"{len(patch['removed'])} removed, {len(patch['changed'])} changed"
+            )
+
+    # Recorded before the outputs are written, so that a snapshot that can't be
+    # appended leaves the outputs and the cache meta as they were.
+    if args.history:
+        with PricingHistory(args.history) as history:
+            changed = history.record(pool_mappings)
+        print(f"Recorded a snapshot in {args.history}, {changed} pools changed")
+
+    # Save result
+    with profiler.stage("serialize", items=len(pool_mappings)):
+        write_outputs(pool_mappings, args.output)
+
+    meta.update({"inputs_digest": digest, "output": str(args.output)})
+    save_cache_meta(args.cache_dir, meta)
+
+
+if __name__ == "__main__":
+    main()
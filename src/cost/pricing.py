@@ -0,0 +1,271 @@
+"""
+Prices machine types in batches with NumPy, so that every pool can be re-priced at
+once when trying out different rates.
+
+    python pricing.py --vcpu-scale 0.9 1.0 1.1 --gpu-scale 0.8 1.0
+"""
+
+import re
+import json
+import time
+import argparse
+import itertools
+import numpy as np
+from pathlib import Path
+from dataclasses import dataclass
+
+cost_path = Path("cpu_costs.json")
+gpu_cost_path = Path("gpu_costs.json")
+
+# Update pricing here:
+# https://cloud.google.com/compute/vm-instance-pricing?hl=en#custommachinetypepricing
+custom_cost_path = Path("custom_costs.json")
+
+# e.g. "custom-4-15360", "n2-custom-8-32768", "n2d-custom-4-32768-ext". The -ext suffix
+# only allows the memory to go over the per vCPU maximum, the memory over it is what is
+# billed at the extended rate, so it isn't captured.
+custom_machine_re = re.compile(r"(?:(n1|n2|n2d|e2)-)?custom-(\d+)-(\d+)(?:-ext)?")
+
+
+@dataclass
+class MachineBatch:
+    """
+    The parsed form of a list of machine types, ready to be priced. Custom machines
+    index into the per-family rates, predefined machines carry their listed price.
+    """
+
+    machine_types: list
+    vcpus: np.ndarray
+    memory_gb: np.ndarray
+    predefined_usd: np.ndarray
+    family: np.ndarray
+    gpu_type: np.ndarray
+    gpu_count: np.ndarray
+
+    def __len__(self):
+        return len(self.machine_types)
+
+
+class PricingIndex:
+    def __init__(self, machine_costs, gpu_costs, custom_rates):
+        self.machine_costs = machine_costs
+        self.gpu_costs = gpu_costs
+        self.custom_rates = custom_rates
+
+        self.families = list(custom_rates)
+        self.family_index = {family: i for i, family in enumerate(self.families)}
+        self.gpu_types = list(gpu_costs)
+        self.gpu_index = {gpu_type: i for i, gpu_type in enumerate(self.gpu_types)}
+
+        self.rates = self.rate_arrays(custom_rates)
+        self.gpu_rates = self.gpu_rate_array(gpu_costs)
+        # The parsed machine types, the same types repeat across many pools.
+        self.machine_specs = {}
+
+    @classmethod
+    def from_files(
+        cls,
+        cost_path=cost_path,
+        gpu_cost_path=gpu_cost_path,
+        custom_cost_path=custom_cost_path,
+    ):
+        return cls(
+            json.loads(cost_path.read_text()),
+            json.loads(gpu_cost_path.read_text()),
+            json.loads(custom_cost_path.read_text()),
+        )
+
+    def rate_arrays(self, custom_rates):
+        """
+        Turns a {family: {rate: value}} table into one array per rate, indexed by
+        family. Families that are missing from `custom_rates` keep the current rates.
+        """
+
+        def rate(family, key):
+            value = custom_rates.get(family, self.custom_rates[family]).get(key)
+            return np.nan if value is None else value
+
+        return {
+            key: np.array([rate(family, key) for family in self.families])
+            for key in (
+                "vcpu",
+                "memory_gb",
+                "extended_memory_gb",
+                "max_memory_gb_per_vcpu",
+            )
+        }
+
+    def gpu_rate_array(self, gpu_costs):
+        return np.array(
+            [
+                np.nan if gpu_costs.get(t) is None else gpu_costs[t]
+                for t in self.gpu_types
+            ]
+        )
+
+    def parse_machine_type(self, machine_type):
+        """
+        Returns (vcpus, memory_gb, predefined_usd, family) for a machine type, where
+        family is -1 for predefined machines. Unknown machines are all NaN.
+        """
+        spec = self.machine_specs.get(machine_type)
+        if spec is None:
+            spec = self.machine_specs[machine_type] = self.machine_spec(machine_type)
+        return spec
+
+    def machine_spec(self, machine_type):
+        cost_data = self.machine_costs.get(machine_type)
+        if cost_data and cost_data.get("usd_per_hour") is not None:
+            return (
+                cost_data["vcpus"],
+                cost_data["memory_gb"],
+                cost_data["usd_per_hour"],
+                -1,
+            )
+
+        match = custom_machine_re.fullmatch(machine_type)
+        if match and (match.group(1) or "n1") in self.family_index:
+            family, vcpus, mem_mib = match.groups()
+            return (
+                int(vcpus),
+                int(mem_mib) / 1024,
+                np.nan,
+                self.family_index[family or "n1"],
+            )
+
+        return (np.nan, np.nan, np.nan, -1)
+
+    def batch(self, machine_types, gpu_types=None, gpu_counts=None):
+        """
+        Parses the machine types once, so the batch can be priced many times.
+        """
+        machine_types = list(machine_types)
+        if gpu_types is None:
+            gpu_types = [None] * len(machine_types)
+        if gpu_counts is None:
+            gpu_counts = [0] * len(machine_types)
+
+        specs = [self.parse_machine_type(t) for t in machine_types]
+        vcpus, memory_gb, predefined_usd, family = zip(*specs) if specs else ([],) * 4
+
+        return MachineBatch(
+            machine_types=machine_types,
+            vcpus=np.array(vcpus, dtype=np.float64),
+            memory_gb=np.array(memory_gb, dtype=np.float64),
+            predefined_usd=np.array(predefined_usd, dtype=np.float64),
+            family=np.array(family, dtype=np.int64),
+            gpu_type=np.array(
+                [self.gpu_index.get(t, -1) if t else -1 for t in gpu_types],
+                dtype=np.int64,
+            ),
+            gpu_count=np.array(gpu_counts, dtype=np.int64),
+        )
+
+    def machine_usd(self, batch, custom_rates=None, predefined_scale=1.0):
+        """
+        The hourly price of each machine without GPUs, NaN when it can't be priced.
+        """
+        rates = self.rates if custom_rates is None else self.rate_arrays(custom_rates)
+        usd = batch.predefined_usd * predefined_scale
+
+        custom = batch.family >= 0
+        family = batch.family[custom]
+        vcpus = batch.vcpus[custom]
+        memory_gb = batch.memory_gb[custom]
+
+        standard_memory = np.minimum(
+            memory_gb, vcpus * rates["max_memory_gb_per_vcpu"][family]
+        )
+        extended_memory = memory_gb - standard_memory
+        extended_usd = np.zeros_like(extended_memory)
+        has_extended = extended_memory > 0
+        extended_usd[has_extended] = (
+            extended_memory[has_extended]
+            * rates["extended_memory_gb"][family[has_extended]]
+        )
+
+        usd[custom] = (
+            vcpus * rates["vcpu"][family]
+            + standard_memory * rates["memory_gb"][family]
+            + extended_usd
+        )
+        return usd
+
+    def gpu_usd(self, batch, gpu_costs=None):
+        """
+        The hourly price of the attached GPUs, 0 without GPUs and NaN when the GPU
+        type has no price.
+        """
+        gpu_rates = (
+            self.gpu_rates if gpu_costs is None else self.gpu_rate_array(gpu_costs)
+        )
+        usd = np.zeros(len(batch))
+        has_gpu = batch.gpu_count > 0
+        gpu_type = batch.gpu_type[has_gpu]
+        usd[has_gpu] = np.where(
+            gpu_type >= 0, gpu_rates[gpu_type] * batch.gpu_count[has_gpu], np.nan
+        )
+        return usd
+
+    def price(self, batch, custom_rates=None, gpu_costs=None, predefined_scale=1.0):
+        """
+        The total hourly price of each machine in the batch, NaN when any part of it
+        can't be priced.
+        """
+        return self.machine_usd(batch, custom_rates, predefined_scale) + self.gpu_usd(
+            batch, gpu_costs
+        )
+
+
+def scaled_rates(custom_rates, vcpu_scale=1.0, memory_scale=1.0):
+    return {
+        family: {
+            **rates,
+            "vcpu": rates["vcpu"] * vcpu_scale,
+            "memory_gb": rates["memory_gb"] * memory_scale,
+        }
+        for family, rates in custom_rates.items()
+    }
+
+
+def main():
+    parser = argparse.ArgumentParser(description=__doc__)
+    parser.add_argument("--pricing", type=Path, default=Path("machine_pricing.json"))
+    parser.add_argument("--vcpu-scale", type=float, nargs="+", default=[1.0])
+    parser.add_argument("--memory-scale", type=float, nargs="+", default=[1.0])
+    parser.add_argument("--gpu-scale", type=float, nargs="+", default=[1.0])
+    parser.add_argument("--predefined-scale", type=float, nargs="+", default=[1.0])
+    args = parser.parse_args()
+
+    index = PricingIndex.from_files()
+    pools = json.loads(args.pricing.read_text())
+    batch = index.batch(
+        [pool["machine_type"] for pool in pools.values()],
+        [pool.get("gpu_type") for pool in pools.values()],
+        [pool.get("gpu_count", 0) for pool in pools.values()],
+    )
+
+    print(
+        f"{'vCPU':>6}{'memory':>8}{'GPU':>6}{'machine':>9}{'USD/hour (all pools)':>24}"
+    )
+    for vcpu_scale, memory_scale, gpu_scale, predefined_scale in itertools.product(
+        args.vcpu_scale, args.memory_scale, args.gpu_scale, args.predefined_scale
+    ):
+        start = time.perf_counter()
+        usd = index.price(
+            batch,
+            custom_rates=scaled_rates(index.custom_rates, vcpu_scale, memory_scale),
+            gpu_costs={
+                k: v * gpu_scale for k, v in index.gpu_costs.items() if v is not None
+            },
+            predefined_scale=predefined_scale,
+        )
+        elapsed_ms = (time.perf_counter() - start) * 1000
+        print(
+            f"{vcpu_scale:>6}{memory_scale:>8}{gpu_scale:>6}{predefined_scale:>9}"
+            f"{np.nansum(usd):>24.2f}  ({elapsed_ms:.2f}ms for {len(batch)} pools)"
+        )
+
+
+if __name__ == "__main__":
+    main()
@@ -0,0 +1,155 @@
+"""
+Diffs two machine_pricing.json mappings into a small patch, and a human readable
+change log of what moved.
+
+    python pricing_diff.py old/machine_pricing.json machine_pricing.json
+
+A patch looks like:
+
+    {
+      "base_sha256": "...",
+      "added": {"pool": {...entry}},
+      "removed": ["pool"],
+      "changed": {"pool": {"machine_type": ["n2-standard-8", "c3-standard-8"]}},
+      "unset": {"pool": ["gpu_type"]}
+    }
+"""
+
+import json
+import hashlib
+import argparse
+import datetime
+from pathlib import Path
+
+
+def mapping_sha256(pool_mappings):
+    return hashlib.sha256(
+        json.dumps(pool_mappings, sort_keys=True).encode()
+    ).hexdigest()
+
+
+def diff_pricing(old, new):
+    added = {pool: new[pool] for pool in new if pool not in old}
+    removed = [pool for pool in old if pool not in new]
+    changed = {}
+    unset = {}
+    for pool in new:
+        if pool not in old or old[pool] == new[pool]:
+            continue
+        # Compare membership too, a field can be added or removed with a None value,
+        # e.g. the price of an unpriced GPU.
+        fields = {
+            field: [old[pool].get(field), value]
+            for field, value in new[pool].items()
+            if field not in old[pool] or old[pool][field] != value
+        }
+        if fields:
+            changed[pool] = fields
+        removed_fields = [field for field in old[pool] if field not in new[pool]]
+        if removed_fields:
+            unset[pool] = removed_fields
+
+    return {
+        "base_sha256": mapping_sha256(old),
+        "sha256": mapping_sha256(new),
+        "added": added,
+        "removed": removed,
+        "changed": changed,
+        "unset": unset,
+    }
+
+
+def apply_patch(pool_mappings, patch):
+    """
+    Returns a new mapping with the patch applied. The base has to be the mapping the
+    patch was computed from.
+    """
+    if mapping_sha256(pool_mappings) != patch["base_sha256"]:
+        raise ValueError("The patch does not apply to this machine pricing")
+
+    result = {
+        pool: dict(entry)
+        for pool, entry in pool_mappings.items()
+        if pool not in patch["removed"]
+    }
+    for pool, fields in patch["changed"].items():
+        for field, (_, new_value) in fields.items():
+            result[pool][field] = new_value
+    for pool, fields in patch["unset"].items():
+        for field in fields:
+            del result[pool][field]
+    result.update(patch["added"])
+    if mapping_sha256(result) != patch["sha256"]:
+        raise ValueError("The patched machine pricing doesn't match the patch")
+    return result
+
+
+def is_empty(patch):
+    return not (
+        patch["added"] or patch["removed"] or patch["changed"] or patch["unset"]
+    )
+
+
+def format_usd(value):
+    return "unpriced" if value is None else f"${value:.4f}/hour"
+
+
+def format_changelog(patch, old):
+    lines = []
+    for pool, entry in sorted(patch["added"].items()):
+        lines.append(
+            f"+ {pool}: {entry['machine_type']} "
+            f"({format_usd(entry.get('usd_per_hour'))})"
+        )
+    for pool in sorted(patch["removed"]):
+        lines.append(f"- {pool}: {old[pool]['machine_type']}")
+    for pool in sorted({*patch["changed"], *patch["unset"]}):
+        fields = patch["changed"].get(pool, {})
+        changes = [
+            f"{field} {old_value} -> {new_value}"
+            for field, (old_value, new_value) in sorted(fields.items())
+            if field != "usd_per_hour"
+        ]
+        changes += [f"{field} unset" for field in sorted(patch["unset"].get(pool, []))]
+        if "usd_per_hour" in fields:
+            old_usd, new_usd = fields["usd_per_hour"]
+            change = f"{format_usd(old_usd)} -> {format_usd(new_usd)}"
+            if old_usd and new_usd is not None:
+                change += f" ({(new_usd - old_usd) / old_usd:+.0%})"
+            changes.insert(0, change)
+        lines.append(f"~ {pool}: " + ", ".join(changes))
+    return lines
+
+
+def write_diff(old, new, patch_path, changelog_path):
+    """
+    Writes the patch, and appends a dated entry to the change log. Returns the patch.
+    """
+    patch = diff_pricing(old, new)
+    patch_path.write_text(json.dumps(patch, separators=(",", ":")))
+
+    lines = format_changelog(patch, old) or ["No changes"]
+    date = datetime.datetime.now(datetime.timezone.utc).strftime("%Y-%m-%d %H:%M")
+    with changelog_path.open("a") as f:
+        f.write(f"## {date} UTC\n\n")
+        f.write("\n".join(lines) + "\n\n")
+    return patch
+
+
+def main():
+    parser = argparse.ArgumentParser(description=__doc__)
+    parser.add_argument("old", type=Path)
+    parser.add_argument("new", type=Path)
+    parser.add_argument("--patch", type=Path, help="Where to write the patch")
+    args = parser.parse_args()
+
+    old = json.loads(args.old.read_text())
+    new = json.loads(args.new.read_text())
+    patch = diff_pricing(old, new)
+    if args.patch:
+        args.patch.write_text(json.dumps(patch, separators=(",", ":")))
+    print("\n".join(format_changelog(patch, old)) or "No changes")
+
+
+if __name__ == "__main__":
+    main()
@@ -0,0 +1,176 @@
+"""
+Writes the compact form of machine_pricing.json for the cost dashboard, and compares
+its size and parse time with the indented JSON.
+
+    python pricing_formats.py machine_pricing.json --zstd
+
+The compact form stores each distinct machine record once, with an index from pool
+to machine:
+
+    {"machines": [{"machine_type": "n2-standard-2", ...}], "pools": {"build-decision": 0}}
+
+The seekable form compresses the compact form of every pool group, e.g. "b-linux" or
+"t-linux", as its own zstd frame, so that the dashboard only decompresses the groups of
+the worker types it shows. See seekable_zstd.py.
+"""
+
+import json
+import time
+import argparse
+from pathlib import Path
+from seekable_zstd import write_seekable, SeekableReader, zstandard_module
+
+compact_path = Path("machine_pricing.compact.json")
+seekable_path = Path("machine_pricing.seekable.zst")
+
+
+def to_compact(pool_mappings):
+    machines = []
+    machine_index = {}
+    pools = {}
+    for pool_key, entry in pool_mappings.items():
+        # The record is hashed with its key order, which is stable for a given run.
+        record_key = json.dumps(entry)
+        if record_key not in machine_index:
+            machine_index[record_key] = len(machines)
+            machines.append(entry)
+        pools[pool_key] = machine_index[record_key]
+    return {"machines": machines, "pools": pools}
+
+
+def from_compact(compact):
+    machines = compact["machines"]
+    return {pool_key: machines[i] for pool_key, i in compact["pools"].items()}
+
+
+def compress_zstd(data):
+    return zstandard_module().ZstdCompressor(level=19).compress(data)
+
+
+def decompress_zstd(data):
+    return zstandard_module().ZstdDecompressor().decompress(data)
+
+
+def write_compact(pool_mappings, path=compact_path, zstd=False):
+    """
+    Writes the compact JSON, and optionally a .zst copy next to it that the
+    frontend decodes with fzstd. Returns the paths that were written.
+    """
+    data = json.dumps(to_compact(pool_mappings), separators=(",", ":")).encode()
+    path.write_bytes(data)
+    paths = [path]
+    if zstd:
+        zstd_path = path.with_name(path.name + ".zst")
+        zstd_path.write_bytes(compress_zstd(data))
+        paths.append(zstd_path)
+    return paths
+
+
+def pool_group(pool):
+    """
+    The first two dash separated parts of the pool, e.g. "b-linux" for
+    "b-linux-large-gcp-d2g". The dashboard groups the worker types the same way.
+    """
+    return "-".join(pool.split("-")[:2])
+
+
+def write_seekable_pricing(pool_mappings, path=seekable_path):
+    """
+    Writes one frame with the compact JSON of each pool group. Returns the paths that
+    were written, the file and its index.
+    """
+    groups = {}
+    for pool_key, entry in pool_mappings.items():
+        groups.setdefault(pool_group(pool_key), {})[pool_key] = entry
+    write_seekable(
+        path,
+        (
+            (group, json.dumps(to_compact(pools), separators=(",", ":")).encode())
+            for group, pools in sorted(groups.items())
+        ),
+    )
+    return [path, path.with_name(path.name + ".json")]
+
+
+def read_seekable_pricing(path, pools):
+    """Reads the pricing of the given pools, decompressing only their groups."""
+    pool_mappings = {}
+    with SeekableReader(path) as reader:
+        for group in sorted({pool_group(pool) for pool in pools}):
+            if group in reader.names:
+                pool_mappings.update(from_compact(json.loads(reader.read(group))))
+    return {pool: pool_mappings[pool] for pool in pools if pool in pool_mappings}
+
+
+def time_parse(fn, repeat=50):
+    best = float("inf")
+    for _ in range(repeat):
+        start = time.perf_counter()
+        fn()
+        best = min(best, time.perf_counter() - start)
+    return best * 1000
+
+
+def main():
+    parser = argparse.ArgumentParser(description=__doc__)
+    parser.add_argument("pricing", type=Path, nargs="?", default="machine_pricing.json")
+    parser.add_argument("--output", type=Path, default=compact_path)
+    parser.add_argument("--zstd", action="store_true", help="Also write a .zst copy")
+    parser.add_argument(
+        "--seekable",
+        action="store_true",
+        help="Also write a seekable .zst with a frame per pool group",
+    )
+    args = parser.parse_args()
+
+    original = args.pricing.read_bytes()
+    pool_mappings = json.loads(original)
+    paths = write_compact(pool_mappings, args.output, args.zstd)
+
+    rows = [(args.pricing, args.pricing, lambda: json.loads(original))]
+    compact = paths[0].read_bytes()
+    rows.append((paths[0], paths[0], lambda: from_compact(json.loads(compact))))
+    if args.zstd:
+        compressed = paths[1].read_bytes()
+        rows.append(
+            (
+                paths[1],
+                paths[1],
+                lambda: from_compact(json.loads(decompress_zstd(compressed))),
+            )
+        )
+    if args.seekable:
+        seekable = args.output.with_name(
+            args.output.name.replace(".compact.json", ".seekable.zst")
+        )
+        write_seekable_pricing(pool_mappings, seekable)
+        one_pool = [next(iter(pool_mappings))]
+        rows.append(
+            (seekable, seekable, lambda: read_seekable_pricing(seekable, pool_mappings))
+        )
+        rows.append(
+            (
+                f"  only {pool_group(one_pool[0])}",
+                seekable,
+                lambda: read_seekable_pricing(seekable, one_pool),
+            )
+        )
+        assert read_seekable_pricing(seekable, pool_mappings) == pool_mappings
+
+    assert from_compact(json.loads(compact)) == pool_mappings
+
+    print(f"{'file':<40}{'bytes':>10}{'ratio':>8}{'parse ms':>10}")
+    for label, path, parse in rows:
+        size = path.stat().st_size
+        print(
+            f"{str(label):<40}{size:>10}{size / len(original):>8.2f}"
+            f"{time_parse(parse):>10.3f}"
+        )
+    print(
+        f"{len(pool_mappings)} pools share "
+        f"{len(json.loads(compact)['machines'])} distinct machine records"
+    )
+
+
+if __name__ == "__main__":
+    main()
@@ -0,0 +1,201 @@
+"""
+An append-only store of machine_pricing.json snapshots, for pricing old task runs at
+the rates that applied when they ran.
+
+    python pricing_history.py record machine_pricing.json
+    python pricing_history.py lookup b-linux-large-gcp --at 2025-03-01
+    python pricing_history.py snapshot --at 2025-03-01 > machine_pricing.json
+
+Only changes are stored: a pool gets a new row when its machine record differs from
+the previous snapshot, and a tombstone row when it disappears. A point-in-time lookup
+is then a single descending seek on the (pool, valid_from) primary key.
+"""
+
+import sys
+import json
+import sqlite3
+import hashlib
+import argparse
+import datetime
+from pathlib import Path
+
+history_path = Path("pricing_history.sqlite")
+
+schema = """
+CREATE TABLE IF NOT EXISTS snapshots (
+    taken_at INTEGER PRIMARY KEY,
+    sha256 TEXT NOT NULL,
+    pool_count INTEGER NOT NULL
+);
+CREATE TABLE IF NOT EXISTS machines (
+    id INTEGER PRIMARY KEY,
+    record TEXT NOT NULL UNIQUE
+);
+CREATE TABLE IF NOT EXISTS pool_prices (
+    pool TEXT NOT NULL,
+    valid_from INTEGER NOT NULL,
+    -- NULL when the pool was removed.
+    machine_id INTEGER REFERENCES machines (id),
+    PRIMARY KEY (pool, valid_from)
+) WITHOUT ROWID;
+"""
+
+
+def parse_time(value):
+    """
+    Accepts unix seconds, or an ISO 8601 date or datetime (UTC when no zone is given).
+    """
+    if isinstance(value, (int, float)):
+        return int(value)
+    if isinstance(value, str) and value.isdigit():
+        return int(value)
+    if isinstance(value, str):
+        value = datetime.datetime.fromisoformat(value.replace("Z", "+00:00"))
+    if value.tzinfo is None:
+        value = value.replace(tzinfo=datetime.timezone.utc)
+    return int(value.timestamp())
+
+
+class PricingHistory:
+    def __init__(self, path=history_path):
+        self.db = sqlite3.connect(path)
+        self.db.executescript(schema)
+
+    def close(self):
+        self.db.close()
+
+    def __enter__(self):
+        return self
+
+    def __exit__(self, *exc):
+        self.close()
+
+    def machine_id(self, entry):
+        record = json.dumps(entry, sort_keys=True, separators=(",", ":"))
+        self.db.execute("INSERT OR IGNORE INTO machines (record) VALUES (?)", (record,))
+        (machine_id,) = self.db.execute(
+            "SELECT id FROM machines WHERE record = ?", (record,)
+        ).fetchone()
+        return machine_id
+
+    def latest_machine_ids(self):
+        rows = self.db.execute("""
+            SELECT pool, machine_id FROM pool_prices AS p
+            WHERE valid_from = (
+                SELECT MAX(valid_from) FROM pool_prices WHERE pool = p.pool
+            )
+            """)
+        return dict(rows)
+
+    def record(self, pool_mappings, taken_at=None):
+        """
+        Appends a snapshot, returns the number of pools that changed. A mapping that
+        is the same as the latest snapshot isn't recorded again, as none of the lookups
+        would change.
+        """
+        if taken_at is None:
+            taken_at = datetime.datetime.now(datetime.timezone.utc)
+        taken_at = parse_time(taken_at)
+        sha256 = hashlib.sha256(
+            json.dumps(pool_mappings, sort_keys=True).encode()
+        ).hexdigest()
+        last = self.db.execute(
+            "SELECT taken_at, sha256 FROM snapshots ORDER BY taken_at DESC LIMIT 1"
+        ).fetchone()
+        if last is not None and last[1] == sha256:
+            return 0
+        if last is not None and taken_at <= last[0]:
+            raise ValueError("Snapshots can only be appended after the latest one")
+
+        with self.db:
+            previous = self.latest_machine_ids()
+            rows = []
+            for pool, entry in pool_mappings.items():
+                machine_id = self.machine_id(entry)
+                if previous.get(pool) != machine_id:
+                    rows.append((pool, taken_at, machine_id))
+            for pool, machine_id in previous.items():
+                if machine_id is not None and pool not in pool_mappings:
+                    rows.append((pool, taken_at, None))
+
+            self.db.executemany(
+                "INSERT INTO pool_prices (pool, valid_from, machine_id) VALUES (?, ?, ?)",
+                rows,
+            )
+            self.db.execute(
+                "INSERT INTO snapshots (taken_at, sha256, pool_count) VALUES (?, ?, ?)",
+                (taken_at, sha256, len(pool_mappings)),
+            )
+        return len(rows)
+
+    def lookup(self, pool, at):
+        """
+        The machine record for a pool at a point in time, or None if it didn't exist.
+        """
+        row = self.db.execute(
+            """
+            SELECT m.record FROM pool_prices AS p
+            LEFT JOIN machines AS m ON m.id = p.machine_id
+            WHERE p.pool = ? AND p.valid_from <= ?
+            ORDER BY p.valid_from DESC
+            LIMIT 1
+            """,
+            (pool, parse_time(at)),
+        ).fetchone()
+        if row is None or row[0] is None:
+            return None
+        return json.loads(row[0])
+
+    def snapshot(self, at):
+        """
+        The full pool mapping as it was at a point in time.
+        """
+        rows = self.db.execute(
+            """
+            SELECT p.pool, m.record FROM pool_prices AS p
+            JOIN machines AS m ON m.id = p.machine_id
+            WHERE p.valid_from = (
+                SELECT MAX(valid_from) FROM pool_prices
+                WHERE pool = p.pool AND valid_from <= ?
+            )
+            ORDER BY p.pool
+            """,
+            (parse_time(at),),
+        )
+        return {pool: json.loads(record) for pool, record in rows}
+
+
+def main():
+    parser = argparse.ArgumentParser(
+        description=__doc__, formatter_class=argparse.RawDescriptionHelpFormatter
+    )
+    parser.add_argument("--db", type=Path, default=history_path)
+    commands = parser.add_subparsers(dest="command", required=True)
+
+    record = commands.add_parser("record", help="Append a machine_pricing.json")
+    record.add_argument("pricing", type=Path)
+    record.add_argument("--at", help="When the snapshot was taken, defaults to now")
+
+    lookup = commands.add_parser("lookup", help="Price of a pool at a time")
+    lookup.add_argument("pool")
+    lookup.add_argument("--at", required=True)
+
+    snapshot = commands.add_parser("snapshot", help="All of the pools at a time")
+    snapshot.add_argument("--at", required=True)
+
+    args = parser.parse_args()
+    with PricingHistory(args.db) as history:
+        if args.command == "record":
+            changed = history.record(json.loads(args.pricing.read_text()), args.at)
+            print(f"Recorded {args.pricing}, {changed} pools changed")
+        elif args.command == "lookup":
+            entry = history.lookup(args.pool, args.at)
+            if entry is None:
+                sys.exit(f"No pricing for {args.pool} at {args.at}")
+            print(json.dumps(entry, indent=2))
+        else:
+            print(json.dumps(history.snapshot(args.at), indent=2))
+
+
+if __name__ == "__main__":
+    main()
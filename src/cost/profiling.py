@@ -0,0 +1,109 @@
+"""
+Timing and allocation tracking for the stages of the pricing pipeline.
+"""
+
+import json
+import time
+import cProfile
+import resource
+import tracemalloc
+from contextlib import contextmanager
+
+
+class StageProfiler:
+    """
+    Records the wall time, item count and (when tracing memory) the peak Python
+    allocations of each stage. Stages can be nested, and a generator can be wrapped
+    with `timed_iter` to time just the work done inside it.
+    """
+
+    def __init__(self, trace_memory=False):
+        self.trace_memory = trace_memory
+        self.stages = {}
+        self.pstats_profile = None
+        if trace_memory:
+            tracemalloc.start()
+
+    def record(self, name):
+        return self.stages.setdefault(name, {"seconds": 0.0, "items": None})
+
+    @contextmanager
+    def stage(self, name, items=None):
+        """
+        Set `record["items"]` on the yielded record to report how much was processed.
+        """
+        record = self.record(name)
+        if items is not None:
+            record["items"] = items
+        if self.trace_memory:
+            tracemalloc.reset_peak()
+        start = time.perf_counter()
+        try:
+            yield record
+        finally:
+            record["seconds"] += time.perf_counter() - start
+            if self.trace_memory:
+                current, peak = tracemalloc.get_traced_memory()
+                record["peak_mb"] = round(peak / 1024 / 1024, 2)
+                record["current_mb"] = round(current / 1024 / 1024, 2)
+
+    def timed_iter(self, name, iterable):
+        """
+        Times only the time spent producing items, not the time the consumer spends
+        on them.
+        """
+        record = self.record(name)
+        record["items"] = 0
+        iterator = iter(iterable)
+        while True:
+            start = time.perf_counter()
+            try:
+                item = next(iterator)
+            except StopIteration:
+                record["seconds"] += time.perf_counter() - start
+                return
+            record["seconds"] += time.perf_counter() - start
+            record["items"] += 1
+            yield item
+
+    @contextmanager
+    def pstats(self, enabled=True):
+        """
+        Runs the block under cProfile, so it can be dumped with `dump_pstats`.
+        """
+        if not enabled:
+            yield
+            return
+        self.pstats_profile = cProfile.Profile()
+        self.pstats_profile.enable()
+        try:
+            yield
+        finally:
+            self.pstats_profile.disable()
+
+    def dump_pstats(self, path):
+        self.pstats_profile.dump_stats(path)
+
+    def report(self):
+        return {
+            "stages": {
+                name: {**record, "seconds": round(record["seconds"], 4)}
+                for name, record in self.stages.items()
+            },
+            "max_rss_mb": round(
+                resource.getrusage(resource.RUSAGE_SELF).ru_maxrss / 1024, 1
+            ),
+            "traced_memory": self.trace_memory,
+        }
+
+    def write(self, path):
+        path.write_text(json.dumps(self.report(), indent=2))
+
+    def print_summary(self):
+        for name, record in self.stages.items():
+            line = f"  {name:<12}{record['seconds']:>9.3f}s"
+            if record.get("items") is not None:
+                line += f"{record['items']:>10} items"
+            if "peak_mb" in record:
+                line += f"{record['peak_mb']:>10} MB peak"
+            print(line)
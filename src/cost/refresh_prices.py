@@ -0,0 +1,292 @@
+"""
+Refreshes cpu_costs.json, gpu_costs.json and machine_pricing.json in one pass.
+
+    python refresh_prices.py
+    python refresh_prices.py --cpu-page saved/vm-instance-pricing.html
+
+The worker-pools.yml and the two pricing pages are fetched concurrently over a shared,
+retrying connection pool, so a refresh takes about as long as the slowest source. The
+pricing pages render their tables with JavaScript, so when the fetched HTML has no
+prices, save the rendered page from the browser and pass its path instead of a URL.
+This does the same table parsing as extract_cpu_costs.js and extract_gpu_costs.js.
+
+With --offline nothing is fetched: worker-pools.yml is read from the cache, and the
+current cpu_costs.json and gpu_costs.json are used for any pricing page given as a URL.
+
+The machine pricing is written with every copy that the dashboard loads, the same as
+extract_machines.py does.
+"""
+
+import re
+import sys
+import json
+import time
+import argparse
+import requests
+from pathlib import Path
+from html.parser import HTMLParser
+from dataclasses import dataclass
+from concurrent.futures import ThreadPoolExecutor
+from requests.adapters import HTTPAdapter
+from urllib3.util.retry import Retry
+from extract_machines import (
+    url as worker_pools_url,
+    cache_dir,
+    output_path,
+    fetch_worker_pools,
+    build_machine_pricing,
+    write_outputs,
+    inputs_digest,
+    load_cache_meta,
+    save_cache_meta,
+)
+from pricing import PricingIndex, cost_path, gpu_cost_path, custom_cost_path
+
+cpu_pricing_url = "https://cloud.google.com/compute/vm-instance-pricing?hl=en"
+gpu_pricing_url = "https://cloud.google.com/compute/gpus-pricing?hl=en"
+
+
+class TableParser(HTMLParser):
+    """
+    Collects the text of every <td> in every <tbody> row, along with the text of any
+    links in the cell.
+    """
+
+    def __init__(self):
+        super().__init__()
+        self.tables = []
+        self.in_tbody = False
+        self.row = None
+        self.cell = None
+        self.link = None
+
+    def handle_starttag(self, tag, attrs):
+        if tag == "table":
+            self.tables.append([])
+        elif tag == "tbody":
+            self.in_tbody = True
+        elif tag == "tr" and self.in_tbody and self.tables:
+            self.row = []
+            self.tables[-1].append(self.row)
+        elif tag == "td" and self.row is not None:
+            self.cell = {"text": "", "links": []}
+            self.row.append(self.cell)
+        elif tag == "a" and self.cell is not None:
+            self.link = ""
+        elif tag == "br" and self.cell is not None:
+            self.cell["text"] += "\n"
+
+    def handle_endtag(self, tag):
+        if tag == "tbody":
+            self.in_tbody = False
+        elif tag == "tr":
+            self.row = None
+        elif tag == "td":
+            self.cell = None
+        elif tag == "a" and self.link is not None and self.cell is not None:
+            self.cell["links"].append(self.link)
+            self.link = None
+
+    def handle_data(self, data):
+        if self.cell is not None:
+            self.cell["text"] += data
+        if self.link is not None:
+            self.link += data
+
+
+def parse_tables(html):
+    parser = TableParser()
+    parser.feed(html)
+    parser.close()
+    return parser.tables
+
+
+def first_number(pattern, text):
+    match = re.search(pattern, text, re.IGNORECASE)
+    if not match:
+        return None
+    # Match JavaScript's parseFloat, which the DevTools scripts used, so that 32 GiB
+    # is written as 32 and not 32.0.
+    number = float(match.group(1))
+    return int(number) if number.is_integer() else number
+
+
+def parse_cpu_costs(html):
+    """
+    Every 4 column row of the VM pricing tables: type, vCPUs, memory and price.
+    """
+    result = {}
+    for table in parse_tables(html):
+        for row in table:
+            if len(row) != 4:
+                continue
+            machine_type = row[0]["text"].strip()
+            vcpus = re.match(r"\s*(\d+)", row[1]["text"])
+            memory_gb = first_number(r"([\d.]+)\s*GiB", row[2]["text"])
+            usd_per_hour = first_number(r"\$([\d.]+)", row[3]["text"])
+            result[machine_type] = {
+                "vcpus": int(vcpus.group(1)) if vcpus else None,
+                "memory_gb": memory_gb,
+                "usd_per_hour": usd_per_hour,
+            }
+    return result
+
+
+def parse_gpu_costs(html):
+    """
+    The first table of the GPU pricing page. Only the first row of a GPU's block has
+    all 6 columns, and the single GPU price is the one that's kept.
+    """
+    tables = parse_tables(html)
+    result = {}
+    model = None
+    for row in tables[0] if tables else []:
+        if len(row) == 6:
+            if row[0]["links"]:
+                model = re.sub(r"\s+", "-", row[0]["links"][0].strip().lower())
+            price = first_number(r"\$([\d.]+)", row[3]["text"])
+            if model and model not in result and price is not None:
+                result[model] = price
+    return result
+
+
+@dataclass
+class Source:
+    name: str
+    # A URL, or the path to a saved copy.
+    location: str
+    timeout: float
+
+
+def create_session(pool_size=8, retries=3):
+    retry = Retry(
+        total=retries,
+        backoff_factor=0.5,
+        status_forcelist=[429, 500, 502, 503, 504],
+        allowed_methods=["GET"],
+    )
+    adapter = HTTPAdapter(
+        pool_connections=pool_size, pool_maxsize=pool_size, max_retries=retry
+    )
+    session = requests.Session()
+    session.mount("http://", adapter)
+    session.mount("https://", adapter)
+    return session
+
+
+# The prices that are used in place of a pricing page when offline.
+current_costs = {"cpu": cost_path, "gpu": gpu_cost_path}
+
+
+def is_url(location):
+    return re.match(r"https?://", location) is not None
+
+
+def read_page(session, source):
+    if not is_url(source.location):
+        return Path(source.location).read_text(encoding="utf-8")
+    resp = session.get(source.location, timeout=source.timeout)
+    resp.raise_for_status()
+    return resp.text
+
+
+def refresh(sources, session, cache_dir=cache_dir, offline=False):
+    """
+    Runs every source at once. Returns ({name: result}, {name: seconds}).
+    """
+
+    def run(name):
+        source = sources[name]
+        start = time.perf_counter()
+        if name == "worker_pools":
+            result = fetch_worker_pools(
+                source.location, cache_dir, offline, session, source.timeout
+            )
+        elif offline and is_url(source.location):
+            result = json.loads(current_costs[name].read_text())
+        else:
+            html = read_page(session, source)
+            result = (parse_cpu_costs if name == "cpu" else parse_gpu_costs)(html)
+            if not result:
+                raise ValueError(
+                    f"No prices were found in {source.location}, save the rendered "
+                    "page from the browser and pass its path instead"
+                )
+        return result, time.perf_counter() - start
+
+    with ThreadPoolExecutor(max_workers=len(sources)) as executor:
+        futures = {name: executor.submit(run, name) for name in sources}
+        outcomes = {name: future.result() for name, future in futures.items()}
+
+    results = {name: result for name, (result, _) in outcomes.items()}
+    timings = {name: seconds for name, (_, seconds) in outcomes.items()}
+    return results, timings
+
+
+def main():
+    parser = argparse.ArgumentParser(
+        description=__doc__, formatter_class=argparse.RawDescriptionHelpFormatter
+    )
+    parser.add_argument("--worker-pools", default=worker_pools_url)
+    parser.add_argument("--cpu-page", default=cpu_pricing_url)
+    parser.add_argument("--gpu-page", default=gpu_pricing_url)
+    parser.add_argument(
+        "--timeout", type=float, default=60, help="Seconds allowed per source"
+    )
+    parser.add_argument("--retries", type=int, default=3)
+    parser.add_argument("--cache-dir", type=Path, default=cache_dir)
+    parser.add_argument(
+        "--offline",
+        action="store_true",
+        help="Don't touch the network, use the cached worker-pools.yml and the "
+        "current prices of any page given as a URL",
+    )
+    parser.add_argument("--output-dir", type=Path, default=Path("."))
+    args = parser.parse_args()
+
+    sources = {
+        "worker_pools": Source("worker_pools", args.worker_pools, args.timeout),
+        "cpu": Source("cpu", args.cpu_page, args.timeout),
+        "gpu": Source("gpu", args.gpu_page, args.timeout),
+    }
+    start = time.perf_counter()
+    try:
+        with create_session(len(sources), args.retries) as session:
+            results, timings = refresh(sources, session, args.cache_dir, args.offline)
+    except (requests.RequestException, ValueError, OSError) as error:
+        sys.exit(f"The refresh failed: {error}")
+    for name, seconds in timings.items():
+        print(f"  {name}: {seconds:.2f}s")
+    print(f"Fetched all sources in {time.perf_counter() - start:.2f}s")
+
+    args.output_dir.mkdir(parents=True, exist_ok=True)
+    (args.output_dir / cost_path).write_text(json.dumps(results["cpu"], indent=2))
+    (args.output_dir / gpu_cost_path).write_text(json.dumps(results["gpu"], indent=2))
+
+    index = PricingIndex(
+        results["cpu"],
+        results["gpu"],
+        json.loads(custom_cost_path.read_text()),
+    )
+    pool_mappings = build_machine_pricing(results["worker_pools"], index)
+    output = args.output_dir / output_path
+    write_outputs(pool_mappings, output)
+    if args.output_dir.resolve() == Path.cwd():
+        # The costs were written where extract_machines.py reads them, so it can skip
+        # its next run when nothing changed upstream.
+        meta = load_cache_meta(args.cache_dir)
+        meta.update(
+            {
+                "inputs_digest": inputs_digest(results["worker_pools"]),
+                "output": str(output),
+            }
+        )
+        save_cache_meta(args.cache_dir, meta)
+    print(
+        f"Saved {len(results['cpu'])} machine prices, {len(results['gpu'])} GPU prices "
+        f"and {len(pool_mappings)} pools to {args.output_dir}"
+    )
+
+
+if __name__ == "__main__":
+    main()
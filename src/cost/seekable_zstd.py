@@ -0,0 +1,160 @@
+"""
+Writes and reads zstd files in the seekable format, where every section is compressed
+as an independent frame, so that a reader only decompresses the frames it needs.
+
+    python seekable_zstd.py machine_pricing.seekable.zst
+    python seekable_zstd.py machine_pricing.seekable.zst b-linux t-linux
+
+The frames are followed by the seek table of the zstd seekable format, a skippable frame
+with the compressed and decompressed size of every frame, which other readers of the
+format understand, and which plain zstd decoders skip. The names of the frames and their
+byte ranges are also written to a .json index next to the file, so that the browser can
+fetch a frame with a range request and decompress it with fzstd.
+
+https://github.com/facebook/zstd/blob/dev/contrib/seekable_format/zstd_seekable_compression_format.md
+"""
+
+import json
+import struct
+import importlib.util
+import argparse
+from pathlib import Path
+
+SKIPPABLE_MAGIC = 0x184D2A5E
+SEEKABLE_MAGIC = 0x8F92EAB1
+FOOTER = struct.Struct("<IBI")
+ENTRY = struct.Struct("<II")
+
+
+def zstandard_installed():
+    return importlib.util.find_spec("zstandard") is not None
+
+
+def zstandard_module():
+    try:
+        import zstandard
+    except ImportError:
+        raise SystemExit("Writing .zst files requires: pip install zstandard")
+    return zstandard
+
+
+def index_path(path):
+    return path.with_name(path.name + ".json")
+
+
+def write_seek_table(out, sizes):
+    """
+    Writes the skippable frame with the (compressed size, decompressed size) of every
+    frame, which ends the file.
+    """
+    table = b"".join(ENTRY.pack(*size) for size in sizes)
+    table += FOOTER.pack(len(sizes), 0, SEEKABLE_MAGIC)
+    out.write(struct.pack("<II", SKIPPABLE_MAGIC, len(table)))
+    out.write(table)
+
+
+def write_seekable(path, frames, level=19):
+    """
+    Compresses every (name, bytes) of `frames` as its own frame, and writes the seek
+    table, and the index of the names. Returns the index.
+    """
+    compressor = zstandard_module().ZstdCompressor(level=level)
+    index = {"format": "zstd-seekable", "frames": []}
+    sizes = []
+    with path.open("wb") as out:
+        for name, data in frames:
+            compressed = compressor.compress(data)
+            index["frames"].append(
+                {
+                    "name": name,
+                    "offset": out.tell(),
+                    "length": len(compressed),
+                    "size": len(data),
+                }
+            )
+            sizes.append((len(compressed), len(data)))
+            out.write(compressed)
+        write_seek_table(out, sizes)
+    index_path(path).write_text(json.dumps(index, indent=1))
+    return index
+
+
+def read_seek_table(f):
+    """The (offset, compressed size, decompressed size) of every frame of the file."""
+    f.seek(-FOOTER.size, 2)
+    count, descriptor, magic = FOOTER.unpack(f.read(FOOTER.size))
+    if magic != SEEKABLE_MAGIC:
+        raise ValueError(f"{f.name} isn't a seekable zstd file")
+    entry_size = ENTRY.size + (4 if descriptor & 0x80 else 0)
+    f.seek(-FOOTER.size - count * entry_size, 2)
+    table = f.read(count * entry_size)
+    frames = []
+    offset = 0
+    for i in range(count):
+        compressed, size = ENTRY.unpack_from(table, i * entry_size)
+        frames.append((offset, compressed, size))
+        offset += compressed
+    return frames
+
+
+class SeekableReader:
+    """
+    Reads the frames of a seekable file by name when it has an index, or by number
+    from its seek table.
+    """
+
+    def __init__(self, path):
+        self.path = Path(path)
+        self.file = self.path.open("rb")
+        self.decompressor = zstandard_module().ZstdDecompressor()
+        self.frames = read_seek_table(self.file)
+        names = index_path(self.path)
+        self.names = {}
+        if names.exists():
+            for i, frame in enumerate(json.loads(names.read_text())["frames"]):
+                self.names[frame["name"]] = i
+
+    def close(self):
+        self.file.close()
+
+    def __enter__(self):
+        return self
+
+    def __exit__(self, *exc):
+        self.close()
+
+    def __len__(self):
+        return len(self.frames)
+
+    def read_frame(self, i):
+        offset, compressed, size = self.frames[i]
+        self.file.seek(offset)
+        return self.decompressor.decompress(
+            self.file.read(compressed), max_output_size=size
+        )
+
+    def read(self, name):
+        return self.read_frame(self.names[name])
+
+
+def main():
+    parser = argparse.ArgumentParser(
+        description=__doc__, formatter_class=argparse.RawDescriptionHelpFormatter
+    )
+    parser.add_argument("path", type=Path)
+    parser.add_argument("names", nargs="*", help="Print these frames")
+    args = parser.parse_args()
+
+    with SeekableReader(args.path) as reader:
+        if args.names:
+            for name in args.names:
+                print(reader.read(name).decode())
+            return
+        names = {i: name for name, i in reader.names.items()}
+        print(f"{'frame':<40}{'bytes':>10}{'zstd':>10}")
+        for i, (offset, compressed, size) in enumerate(reader.frames):
+            print(f"{names.get(i, str(i)):<40}{size:>10}{compressed:>10}")
+
+
+if __name__ == "__main__":
+    main()
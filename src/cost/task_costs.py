@@ -0,0 +1,239 @@
+"""
+Aggregates the cost of task runs from a JSON Lines export, priced with
+machine_pricing.json.
+
+    python task_costs.py task-runs.jsonl --output task_costs.json
+
+Each line is a task run:
+
+    {"workerType": "b-linux-large-gcp", "started": "2025-03-01T10:00:00.000Z",
+     "resolved": "2025-03-01T11:30:00.000Z", "kind": "train-backwards"}
+
+The kind is optional, and falls back to `tags.kind`. Runs are read in chunks and summed
+with NumPy, so memory is bounded by the chunk size and the number of groups, not the
+size of the export. A run's cost is attributed to the day it started.
+"""
+
+import sys
+import json
+import argparse
+import itertools
+import numpy as np
+from pathlib import Path
+
+pricing_path = Path("machine_pricing.json")
+
+
+def load_pool_entries(path=pricing_path):
+    """
+    Returns {pool: entry} from machine_pricing.json, or from its compact form.
+    """
+    pool_mappings = json.loads(path.read_text())
+    if "machines" in pool_mappings and "pools" in pool_mappings:
+        machines = pool_mappings["machines"]
+        pool_mappings = {
+            pool: machines[i] for pool, i in pool_mappings["pools"].items()
+        }
+    return pool_mappings
+
+
+def load_pool_prices(path=pricing_path):
+    """
+    Returns {pool: usd_per_hour}, including the historical names of the -d2g pools,
+    like the cost dashboard does.
+    """
+    pool_mappings = load_pool_entries(path)
+    prices = {pool: entry.get("usd_per_hour") for pool, entry in pool_mappings.items()}
+    for pool, usd in list(prices.items()):
+        prices.setdefault(pool.replace("-d2g", ""), usd)
+    return prices
+
+
+class Interner:
+    """
+    Maps strings to dense integer ids, so they can be used as array indexes.
+    """
+
+    def __init__(self):
+        self.ids = {}
+        self.names = []
+
+    def __call__(self, name):
+        i = self.ids.get(name)
+        if i is None:
+            i = self.ids[name] = len(self.names)
+            self.names.append(name)
+        return i
+
+
+def parse_times(values):
+    # NumPy doesn't take the "Z" suffix, all of the Taskcluster times are UTC.
+    return np.array(
+        [value[:-1] if value and value[-1] == "Z" else value for value in values],
+        dtype="datetime64[ms]",
+    ).astype(np.int64)
+
+
+class TaskCostAggregator:
+    def __init__(self, pool_prices, scalar=1.0):
+        self.pool_prices = pool_prices
+        self.scalar = scalar
+        self.pools = Interner()
+        self.kinds = Interner()
+        # Hourly price by pool id, NaN for pools without pricing.
+        self.pool_usd = np.zeros(0)
+        # (pool, kind, day) -> [runs, hours, usd]
+        self.groups = {}
+        self.skipped = 0
+
+    def pool_ids(self, worker_types):
+        ids = np.fromiter(
+            (self.pools(t) for t in worker_types),
+            dtype=np.int64,
+            count=len(worker_types),
+        )
+        if len(self.pools.names) > len(self.pool_usd):
+            new_pools = self.pools.names[len(self.pool_usd) :]
+            self.pool_usd = np.concatenate(
+                [
+                    self.pool_usd,
+                    np.array(
+                        [self.pool_prices.get(p) for p in new_pools], dtype=np.float64
+                    ),
+                ]
+            )
+        return ids
+
+    def add_chunk(self, records):
+        worker_types = []
+        kinds = []
+        started = []
+        resolved = []
+        for record in records:
+            if not record.get("started") or not record.get("resolved"):
+                self.skipped += 1
+                continue
+            worker_types.append(record.get("workerType", "unknown"))
+            kinds.append(
+                record.get("kind")
+                or (record.get("tags") or {}).get("kind")
+                or "unknown"
+            )
+            started.append(record["started"])
+            resolved.append(record["resolved"])
+        if not worker_types:
+            return
+
+        pool = self.pool_ids(worker_types)
+        kind = np.fromiter((self.kinds(k) for k in kinds), dtype=np.int64)
+        start_ms = parse_times(started)
+        end_ms = parse_times(resolved)
+
+        hours = (end_ms - start_ms) / 3_600_000
+        valid = hours >= 0
+        self.skipped += int((~valid).sum())
+        pool, kind, start_ms, hours = (
+            pool[valid],
+            kind[valid],
+            start_ms[valid],
+            hours[valid],
+        )
+        day = start_ms // 86_400_000
+        usd = np.nan_to_num(self.pool_usd[pool]) * hours * self.scalar
+
+        keys = np.stack([pool, kind, day], axis=1)
+        unique_keys, inverse = np.unique(keys, axis=0, return_inverse=True)
+        inverse = inverse.reshape(-1)
+        runs_sum = np.bincount(inverse, minlength=len(unique_keys))
+        hours_sum = np.bincount(inverse, weights=hours, minlength=len(unique_keys))
+        usd_sum = np.bincount(inverse, weights=usd, minlength=len(unique_keys))
+
+        for key, runs, h, u in zip(
+            map(tuple, unique_keys.tolist()), runs_sum, hours_sum, usd_sum
+        ):
+            group = self.groups.get(key)
+            if group is None:
+                self.groups[key] = [int(runs), h, u]
+            else:
+                group[0] += int(runs)
+                group[1] += h
+                group[2] += u
+
+    def table(self, columns):
+        """
+        Sums the groups by a subset of ("pool", "kind", "day"), as a compact table.
+        """
+        positions = [("pool", "kind", "day").index(column) for column in columns]
+        totals = {}
+        for key, (runs, hours, usd) in self.groups.items():
+            group_key = tuple(key[p] for p in positions)
+            total = totals.setdefault(group_key, [0, 0.0, 0.0])
+            total[0] += runs
+            total[1] += hours
+            total[2] += usd
+
+        def label(column, value):
+            if column == "pool":
+                return self.pools.names[value]
+            if column == "kind":
+                return self.kinds.names[value]
+            return str(np.datetime64(value, "D"))
+
+        rows = [
+            [label(c, v) for c, v in zip(columns, key)]
+            + [runs, round(hours, 3), round(usd, 2)]
+            for key, (runs, hours, usd) in totals.items()
+        ]
+        if columns == ["day"]:
+            rows.sort()
+        else:
+            rows.sort(key=lambda row: -row[-1])
+        return {"columns": [*columns, "runs", "hours", "usd"], "rows": rows}
+
+    def summary(self):
+        unpriced = sorted(
+            name for name, usd in zip(self.pools.names, self.pool_usd) if np.isnan(usd)
+        )
+        return {
+            "by_pool": self.table(["pool"]),
+            "by_kind": self.table(["kind"]),
+            "by_day": self.table(["day"]),
+            "by_pool_kind_day": self.table(["pool", "kind", "day"]),
+            "unpriced_pools": unpriced,
+            "skipped_runs": self.skipped,
+        }
+
+
+def read_chunks(path, chunk_size):
+    with path.open() if str(path) != "-" else sys.stdin as f:
+        lines = (line for line in f if line.strip())
+        while chunk := list(itertools.islice(lines, chunk_size)):
+            yield [json.loads(line) for line in chunk]
+
+
+def main():
+    parser = argparse.ArgumentParser(
+        description=__doc__, formatter_class=argparse.RawDescriptionHelpFormatter
+    )
+    parser.add_argument("runs", type=Path, help="JSON Lines of task runs, or -")
+    parser.add_argument("--pricing", type=Path, default=pricing_path)
+    parser.add_argument("--output", type=Path, default=Path("task_costs.json"))
+    parser.add_argument("--chunk-size", type=int, default=100_000)
+    parser.add_argument("--scalar", type=float, default=1.0, help="Cost scalar")
+    args = parser.parse_args()
+
+    aggregator = TaskCostAggregator(load_pool_prices(args.pricing), args.scalar)
+    for chunk in read_chunks(args.runs, args.chunk_size):
+        aggregator.add_chunk(chunk)
+
+    summary = aggregator.summary()
+    args.output.write_text(json.dumps(summary, separators=(",", ":")))
+
+    total = sum(row[-1] for row in summary["by_pool"]["rows"])
+    print(f"Saved {args.output}, ${total:,.2f} in total")
+    if summary["unpriced_pools"]:
+        print(f"No pricing for: {', '.join(summary['unpriced_pools'])}")
+
+
+if __name__ == "__main__":
+    main()